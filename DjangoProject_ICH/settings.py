@@ -22,6 +22,25 @@ Env.read_env(BASE_DIR / '.env')
 LOGS_DIR = BASE_DIR / 'logs'
 LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Files are written by a background thread (task_manager.log_handlers.QueueFileHandler),
+# one JSON object per line. Rotation is by size unless LOG_ROTATE_WHEN (e.g. 'midnight') is set.
+LOG_MAX_BYTES = env.int('LOG_MAX_BYTES', default=10 * 1024 * 1024)
+LOG_BACKUP_COUNT = env.int('LOG_BACKUP_COUNT', default=5)
+LOG_ROTATE_WHEN = env('LOG_ROTATE_WHEN', default=None)
+LOG_QUEUE_SIZE = env.int('LOG_QUEUE_SIZE', default=10000)
+# SQL is only logged with DEBUG on: every query slower than LOG_SLOW_QUERY_MS, plus a sample of the rest
+LOG_SLOW_QUERY_MS = env.float('LOG_SLOW_QUERY_MS', default=100)
+LOG_QUERY_SAMPLE_RATE = env.float('LOG_QUERY_SAMPLE_RATE', default=0.0)
+
+LOG_FILE_OPTIONS = {
+    'class': 'task_manager.log_handlers.QueueFileHandler',
+    'formatter': 'json',
+    'max_bytes': LOG_MAX_BYTES,
+    'backup_count': LOG_BACKUP_COUNT,
+    'when': LOG_ROTATE_WHEN,
+    'queue_size': LOG_QUEUE_SIZE,
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -35,6 +54,17 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'task_manager.log_handlers.JSONFormatter',
+        },
+    },
+
+    'filters': {
+        'slow_queries': {
+            '()': 'task_manager.log_handlers.SlowQueryFilter',
+            'slow_ms': LOG_SLOW_QUERY_MS,
+            'sample_rate': LOG_QUERY_SAMPLE_RATE,
+        },
     },
 
     'handlers': {
@@ -43,16 +73,17 @@ LOGGING = {
             'formatter': 'simple',
         },
         'http_file': {
-            'class': 'logging.FileHandler',
+            **LOG_FILE_OPTIONS,
             'filename': LOGS_DIR / 'http_logs.log',
-            'formatter': 'verbose',
-            'encoding': 'utf-8',
         },
         'db_file': {
-            'class': 'logging.FileHandler',
+            **LOG_FILE_OPTIONS,
             'filename': LOGS_DIR / 'db_logs.log',
-            'formatter': 'verbose',
-            'encoding': 'utf-8',
+            'filters': ['slow_queries'],
+        },
+        'query_budget_file': {
+            **LOG_FILE_OPTIONS,
+            'filename': LOGS_DIR / 'query_budget_logs.log',
         },
     },
 
@@ -72,6 +103,16 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'task_manager.db_router': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'task_manager.query_budget': {
+            'handlers': ['console', 'query_budget_file'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
 
@@ -82,37 +123,10 @@ LOGGING = {
 SECRET_KEY = env('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = env('DEBUG')
+DEBUG = env.bool('DEBUG', default=False)
 
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', default=['127.0.0.1'])
 
-if env.bool("USE_MYSQL"):
-    DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.mysql',
-            'NAME': env("MYSQL_NAME"),
-            'USER': env("MYSQL_USER"),
-            'PASSWORD': env("MYSQL_PASSWORD"),
-            'HOST': env("MYSQL_HOST", default="localhost"),
-            'PORT': env("MYSQL_PORT", default="3306"),
-        }
-    }
-
-    # Only if you use pymysql
-    try:
-        import pymysql
-        pymysql.install_as_MySQLdb()
-    except ImportError:
-        pass
-
-else:
-    DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
-        }
-    }
-
 # Application definition
 
 INSTALLED_APPS = [
@@ -137,6 +151,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'task_manager.query_budget.QueryBudgetMiddleware',
+    'task_manager.middleware.ReplicaRoutingMiddleware',
+    'task_manager.middleware.PerformanceMiddleware',
     'task_manager.middleware.JWTAuthenticationMiddleware'
 ]
 
@@ -164,20 +181,81 @@ WSGI_APPLICATION = 'DjangoProject_ICH.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+if env.bool("USE_MYSQL"):
+    # task_manager.mysql_backend is Django's MySQL backend (mysqlclient) with an optional
+    # pool: MYSQL_POOL_SIZE > 0 shares that many connections per process. Without the pool
+    # each thread keeps its connection for DB_CONN_MAX_AGE seconds.
+    MYSQL_POOL_SIZE = env.int("MYSQL_POOL_SIZE", default=0)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'task_manager.mysql_backend',
+            'NAME': env("MYSQL_NAME"),
+            'USER': env("MYSQL_USER"),
+            'PASSWORD': env("MYSQL_PASSWORD"),
+            'HOST': env("MYSQL_HOST", default="localhost"),
+            'PORT': env("MYSQL_PORT", default="3306"),
+            'CONN_MAX_AGE': 0 if MYSQL_POOL_SIZE else env.int("DB_CONN_MAX_AGE", default=60),
+            'CONN_HEALTH_CHECKS': env.bool("DB_CONN_HEALTH_CHECKS", default=True),
+            'OPTIONS': {},
+        }
     }
-}
+    if MYSQL_POOL_SIZE:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'max_size': MYSQL_POOL_SIZE,
+            # Seconds to wait for a free connection before failing the query
+            'timeout': env.float("MYSQL_POOL_TIMEOUT", default=10),
+            # Connections are closed after this many seconds, below MySQL's wait_timeout
+            'max_lifetime': env.float("MYSQL_POOL_MAX_LIFETIME", default=3600),
+            # Connections idle for longer are pinged before reuse
+            'check_idle': env.float("MYSQL_POOL_CHECK_IDLE", default=30),
+        }
+    # Read replicas as host or host:port, same credentials as the primary
+    for index, replica in enumerate(env.list("MYSQL_REPLICA_HOSTS", default=[]), start=1):
+        host, _, port = replica.partition(':')
+        DATABASES[f'replica_{index}'] = {
+            **DATABASES['default'],
+            'HOST': host,
+            'PORT': port or DATABASES['default']['PORT'],
+            'TEST': {'MIRROR': 'default'},
+        }
+
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+    # A second SQLite file standing in for a replica locally, refreshed by `manage.py sync_sqlite_replica`
+    if env("SQLITE_REPLICA_NAME", default=None):
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / env("SQLITE_REPLICA_NAME"),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# GET requests to the list, stats and tasks-by-day views read from a replica
+# (task_manager.db_router); everything else, and a client's reads for
+# REPLICA_STICKY_SECONDS after it wrote, goes to the primary. Replicas further
+# behind than REPLICA_MAX_LAG seconds, or unreachable, are skipped for
+# REPLICA_CHECK_INTERVAL seconds.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['task_manager.db_router.ReplicaRouter']
+REPLICA_MAX_LAG = env.float('REPLICA_MAX_LAG', default=5)
+REPLICA_CHECK_INTERVAL = env.float('REPLICA_CHECK_INTERVAL', default=5)
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=10)
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'task_manager.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'task_manager.metrics.TimedJSONRenderer',
+        'task_manager.metrics.TimedBrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'task_manager.paginator.DefaultCursorPagination',
     'PAGE_SIZE': 5,
 }
@@ -190,6 +268,34 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Verified access tokens are kept in a per-process LRU (never past their `exp`),
+# users in the cache framework until they are saved or deleted.
+JWT_TOKEN_CACHE_SIZE = env.int('JWT_TOKEN_CACHE_SIZE', default=1024)
+JWT_TOKEN_CACHE_TTL = env.int('JWT_TOKEN_CACHE_TTL', default=60)
+JWT_USER_CACHE_TIMEOUT = env.int('JWT_USER_CACHE_TIMEOUT', default=300)
+
+# locmemcache:// or filecache:///path locally, a shared cache (e.g. redis://) in production
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Cached list responses are invalidated by per-model generations bumped on every write
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=300)
+
+# Per-request phase timings (Server-Timing header) and per-route histograms on /metrics.
+# Only a METRICS_SAMPLE_RATE share of requests is timed; all of them are counted.
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+METRICS_SAMPLE_RATE = env.float('METRICS_SAMPLE_RATE', default=1.0)
+METRICS_SERVER_TIMING = env.bool('METRICS_SERVER_TIMING', default=True)
+METRICS_TOKEN = env('METRICS_TOKEN', default=None)
+# Scrapers allowed without METRICS_TOKEN; anyone else gets 403 from /metrics
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=[])
+
+# Views and signal handlers declare query budgets. 'log' warns about requests over budget
+# (task_manager.query_budget logger); the test runner always runs with 'raise'.
+QUERY_BUDGET_MODE = env('QUERY_BUDGET_MODE', default=None)
+TEST_RUNNER = 'task_manager.test_runner.QueryBudgetTestRunner'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
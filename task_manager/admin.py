@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Task, SubTask, Category
+from django.db import transaction
+from django.utils import timezone
+from .models import Task, SubTask, Category, EmailNotification
+from .notifications import enqueue_status_change
+from .paginator import CountingPaginator
+from .response_cache import bump_generation
+from .stats import invalidate_task_stats
 
 
 # Register your models here.
@@ -30,6 +36,8 @@ class TaskAdmin(admin.ModelAdmin):
         }),
     )
     list_per_page = 5
+    paginator = CountingPaginator
+    show_full_result_count = False
     inlines = [SubtaskInline]
 
     def short_title(self, obj):
@@ -38,7 +46,14 @@ class TaskAdmin(admin.ModelAdmin):
     short_title.short_description = 'Title'
 
     def update_status(self, request, queryset):
-        queryset.update(status='done')
+        with transaction.atomic():
+            tasks = list(queryset.exclude(status='done').select_related('owner'))
+            Task.objects.filter(pk__in=[task.pk for task in tasks]).update(status='done', updated_at=timezone.now())
+            for task in tasks:
+                task.status = 'done'
+            enqueue_status_change(tasks)
+            transaction.on_commit(invalidate_task_stats)
+            bump_generation(Task)
     actions = [update_status]
 
 
@@ -56,4 +71,15 @@ class SubTaskAdmin(admin.ModelAdmin):
             'fields': ('status', 'deadline')
         }),
     )
-    list_per_page = 5
\ No newline at end of file
+    list_per_page = 5
+    paginator = CountingPaginator
+    show_full_result_count = False
+
+
+@admin.register(EmailNotification)
+class EmailNotificationAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'recipient')
+    readonly_fields = ('created_at', 'sent_at')
+    list_per_page = 20
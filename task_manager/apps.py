@@ -6,4 +6,13 @@ class TaskManagerConfig(AppConfig):
     name = 'task_manager'
 
     def ready(self):
-        import task_manager.signals
\ No newline at end of file
+        import task_manager.signals
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+        from .metrics import install_query_timer
+        from .query_budget import install_query_recorder
+
+        for install in (install_query_timer, install_query_recorder):
+            connection_created.connect(install)
+            for connection in connections.all(initialized_only=True):
+                install(connection=connection)
\ No newline at end of file
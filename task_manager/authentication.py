@@ -0,0 +1,237 @@
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import router
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .metrics import timed
+
+
+USER_CACHE_TIMEOUT = getattr(settings, 'JWT_USER_CACHE_TIMEOUT', 300)
+REFRESH_RESULT_TIMEOUT = getattr(settings, 'JWT_REFRESH_RESULT_TIMEOUT', 30)
+REFRESH_LOCK_TIMEOUT = getattr(settings, 'JWT_REFRESH_LOCK_TIMEOUT', 5)
+
+
+class VerifiedTokenCache:
+    """
+    In-process LRU of access tokens that already passed signature and expiry checks,
+    keyed by the token signature. An entry never outlives the token's own `exp`.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(raw_token):
+        return raw_token.rsplit('.', 1)[-1]
+
+    def get(self, raw_token):
+        key = self._key(raw_token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            token, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return token
+
+    def add(self, raw_token, token):
+        expires_at = min(time.time() + self.ttl, token['exp'])
+        with self._lock:
+            self._entries[self._key(raw_token)] = (token, expires_at)
+            self._entries.move_to_end(self._key(raw_token))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def verify(self, raw_token):
+        """Return a validated AccessToken, raising TokenError like AccessToken() does."""
+        token = self.get(raw_token)
+        if token is None:
+            token = AccessToken(raw_token)
+            self.add(raw_token, token)
+        return token
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = VerifiedTokenCache(
+    maxsize=getattr(settings, 'JWT_TOKEN_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'JWT_TOKEN_CACHE_TTL', 60),
+)
+
+
+class SingleFlightRefresher:
+    """
+    Coalesces concurrent refreshes of the same refresh token: one caller verifies
+    the refresh token and mints the access token, the others reuse it from the cache.
+
+    Callers in this process wait on a per-token lock; other processes wait on a
+    cache.add() lock and poll for the result, refreshing themselves if it never shows up.
+    """
+
+    def __init__(self, result_timeout=REFRESH_RESULT_TIMEOUT, lock_timeout=REFRESH_LOCK_TIMEOUT, poll_interval=0.05):
+        self.result_timeout = result_timeout
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._locks = weakref.WeakValueDictionary()
+        self._locks_guard = threading.Lock()
+
+    def _local_lock(self, key):
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _cached_result(self, result_key):
+        raw_token = cache.get(result_key)
+        if raw_token is None:
+            return None
+        try:
+            return token_cache.verify(raw_token)
+        except TokenError:
+            return None
+
+    def refresh(self, refresh_token):
+        """Return an AccessToken minted from `refresh_token`, raising TokenError if it is invalid."""
+        key = hashlib.sha256(refresh_token.encode()).hexdigest()
+        result_key, lock_key = f'jwt_refresh:{key}', f'jwt_refresh_lock:{key}'
+
+        token = self._cached_result(result_key)
+        if token is not None:
+            return token
+
+        with self._local_lock(key):
+            token = self._cached_result(result_key)
+            if token is not None:
+                return token
+
+            acquired = cache.add(lock_key, 1, self.lock_timeout)
+            if not acquired:
+                deadline = time.monotonic() + self.lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(self.poll_interval)
+                    token = self._cached_result(result_key)
+                    if token is not None:
+                        return token
+            try:
+                token = RefreshToken(refresh_token).access_token
+                raw_token = str(token)
+                token_cache.add(raw_token, token)
+                timeout = max(1, min(self.result_timeout, int(token['exp'] - time.time())))
+                cache.set(result_key, raw_token, timeout)
+                return token
+            finally:
+                if acquired:
+                    cache.delete(lock_key)
+
+
+refresher = SingleFlightRefresher()
+
+
+# In User field order, as Model.from_db() expects. is_staff is read by the permission classes on every request.
+USER_CACHE_FIELDS = ('id', 'username', 'is_staff', 'is_active')
+
+
+def user_cache_key(user_id):
+    return f'auth:user-fields:{user_id}'
+
+
+def _user_from_cache(values):
+    # The other fields are deferred: reading one loads it, and save() writes only the loaded ones
+    return User.from_db(router.db_for_read(User), USER_CACHE_FIELDS, values)
+
+
+def get_cached_user(user_id):
+    """
+    User by id, built from the few fields authentication needs, which are cached (not the
+    whole pickled User with its password hash); entries are dropped when the user is saved or deleted.
+    """
+    key = user_cache_key(user_id)
+    values = cache.get(key)
+    if values is None:
+        values = User.objects.filter(pk=user_id).values_list(*USER_CACHE_FIELDS).first()
+        if values is None:
+            return None
+        cache.set(key, values, USER_CACHE_TIMEOUT)
+    return _user_from_cache(values)
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+async def aget_cached_user(user_id):
+    key = user_cache_key(user_id)
+    values = await cache.aget(key)
+    if values is None:
+        values = await User.objects.filter(pk=user_id).values_list(*USER_CACHE_FIELDS).afirst()
+        if values is None:
+            return None
+        await cache.aset(key, values, USER_CACHE_TIMEOUT)
+    return _user_from_cache(values)
+
+
+def get_token_user(token):
+    user = get_cached_user(token[api_settings.USER_ID_CLAIM])
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+async def aget_token_user(token):
+    user = await aget_cached_user(token[api_settings.USER_ID_CLAIM])
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Reuses the user and token JWTAuthenticationMiddleware already verified
+    from the cookie; header tokens go through the same verified-token and user caches.
+    """
+
+    def authenticate(self, request):
+        django_request = getattr(request, '_request', request)
+        user = getattr(django_request, 'jwt_user', None)
+        if user is not None:
+            return user, django_request.jwt_token
+        with timed('auth'):
+            return super().authenticate(request)
+
+    def get_validated_token(self, raw_token):
+        if isinstance(raw_token, bytes):
+            raw_token = raw_token.decode()
+        try:
+            return token_cache.verify(raw_token)
+        except TokenError as exc:
+            raise InvalidToken({
+                'detail': 'Given token not valid for any token type',
+                'messages': [{'token_class': AccessToken.__name__, 'token_type': AccessToken.token_type, 'message': exc.args[0]}],
+            })
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+        user = get_token_user(validated_token)
+        if user is None:
+            raise AuthenticationFailed('User not found or inactive', code='user_not_found')
+        return user
@@ -0,0 +1,3 @@
+def percentile(values, fraction):
+    """Nearest-rank percentile of already sorted `values`, e.g. fraction=0.95 for p95."""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
@@ -0,0 +1,305 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import Task, SubTask
+from .notifications import enqueue_status_change
+from .response_cache import bump_generation
+from .serializers import BulkManyRelatedField, BulkPrimaryKeyRelatedField, TaskBulkSerializer, SubTaskBulkSerializer, TaskModelSerializer, SubTaskCreateSerializer
+from .stats import invalidate_task_stats
+
+
+CHUNK_SIZE = getattr(settings, 'BULK_CHUNK_SIZE', 500)
+MAX_ITEMS = getattr(settings, 'BULK_MAX_ITEMS', 1000)
+
+
+class BulkWriter:
+    """
+    Validates a list payload in one pass and writes it with bulk_create/bulk_update
+    in chunks. Items that fail validation or permission checks are reported by
+    index and skipped; the rest of the batch is still written.
+    """
+    model = None
+    serializer_class = None
+    output_serializer_class = None
+    unique_field = 'title'
+    m2m_fields = ()  # links written through the through-table
+
+    def __init__(self, request, view, chunk_size=CHUNK_SIZE):
+        self.request = request
+        self.view = view
+        self.chunk_size = chunk_size
+        self.errors = []
+
+    def add_error(self, index, errors):
+        self.errors.append({'index': index, 'errors': errors})
+
+    def has_object_permission(self, obj):
+        return all(
+            permission.has_object_permission(self.request, self.view, obj)
+            for permission in self.view.get_permissions()
+        )
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'view': self.view}
+
+    def preload_related(self, items):
+        """
+        Fetch the related objects every item refers to with one query per relation, so the
+        items' BulkPrimaryKeyRelatedFields validate without querying.
+        """
+        preloaded = {}
+        for name, field in self.serializer_class(context=self.get_serializer_context()).fields.items():
+            many = isinstance(field, BulkManyRelatedField)
+            relation = field.child_relation if many else field
+            if field.read_only or not isinstance(relation, BulkPrimaryKeyRelatedField):
+                continue
+            pks = set()
+            for item in items:
+                if not isinstance(item, dict) or item.get(name) is None:
+                    continue
+                values = item[name] if many and isinstance(item[name], list) else [item[name]]
+                for value in values:
+                    try:
+                        pks.add(relation.to_pk(value))
+                    except ValidationError:
+                        pass  # reported by the item's own validation
+            preloaded[name] = relation.get_queryset().in_bulk(pks) if pks else {}
+        return preloaded
+
+    # Validation helpers, each drops the failing entries
+
+    def item_ids(self, items):
+        """
+        The primary key of every item, converted like the model field does, or None where it
+        is missing or malformed; those items are reported by index.
+        """
+        ids = []
+        for index, item in enumerate(items):
+            pk = item.get('id') if isinstance(item, dict) else None
+            if pk is None:
+                self.add_error(index, {'id': ['This field is required.']})
+            else:
+                try:
+                    pk = self.model._meta.pk.to_python(pk)
+                except DjangoValidationError as exc:
+                    self.add_error(index, {'id': exc.messages})
+                    pk = None
+            ids.append(pk)
+        return ids
+
+    def validate_items(self, items, instances=None, ids=None):
+        context = {**self.get_serializer_context(), 'preloaded_related': self.preload_related(items)}
+        entries = []
+        for index, item in enumerate(items):
+            instance = None
+            if instances is not None:
+                pk = ids[index]
+                if pk is None:
+                    continue  # reported by item_ids()
+                instance = instances.get(pk)
+                if instance is None:
+                    self.add_error(index, {'id': [f'Object with id {pk} does not exist.']})
+                    continue
+                if not self.has_object_permission(instance):
+                    self.add_error(index, {'detail': 'You do not have permission to perform this action.'})
+                    continue
+            serializer = self.serializer_class(instance, data=item, partial=instance is not None, context=context)
+            if not serializer.is_valid():
+                self.add_error(index, serializer.errors)
+                continue
+            data = dict(serializer.validated_data)
+            data.pop('id', None)
+            entries.append({'index': index, 'data': data, 'instance': instance})
+        return entries
+
+    def check_unique(self, entries):
+        field = self.unique_field
+        values = [entry['data'][field] for entry in entries if field in entry['data']]
+        taken = dict(self.model.objects.filter(**{f'{field}__in': values}).values_list(field, 'pk'))
+        seen = set()
+        valid = []
+        for entry in entries:
+            value = entry['data'].get(field)
+            if value is not None:
+                own_pk = entry['instance'].pk if entry['instance'] else None
+                if value in seen or taken.get(value, own_pk) != own_pk:
+                    self.add_error(entry['index'], {field: [f'{self.model._meta.verbose_name} with this {field} already exists.']})
+                    continue
+                seen.add(value)
+            valid.append(entry)
+        return valid
+
+    # Writes
+
+    def split_m2m(self, entries):
+        """The plain field values and the m2m values of every entry."""
+        data = [{name: value for name, value in entry['data'].items() if name not in self.m2m_fields} for entry in entries]
+        m2m_values = [{name: entry['data'][name] for name in self.m2m_fields if name in entry['data']} for entry in entries]
+        return data, m2m_values
+
+    def write_m2m(self, objs, m2m_values, replace=False):
+        for name in self.m2m_fields:
+            field = self.model._meta.get_field(name)
+            through = field.remote_field.through
+            source, target = f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+            pairs = [(obj, values[name]) for obj, values in zip(objs, m2m_values) if name in values]
+            if not pairs:
+                continue
+            if replace:
+                through.objects.filter(**{f'{source}__in': [obj.pk for obj, _ in pairs]}).delete()
+            through.objects.bulk_create(
+                [through(**{source: obj.pk, target: related.pk}) for obj, related_objs in pairs for related in related_objs],
+                batch_size=self.chunk_size,
+                ignore_conflicts=True,
+            )
+
+    def build(self, data):
+        return self.model(owner=self.request.user, **data)
+
+    def after_write(self, objs, created):
+        pass
+
+    def write(self, entries, write):
+        """
+        Run `write(entries)` in a transaction. A unique value another request took after
+        check_unique() fails the whole statement; those entries are reported and the rest retried once.
+        """
+        if not entries:
+            return []
+        try:
+            with transaction.atomic():
+                return write(entries)
+        except IntegrityError:
+            remaining = self.check_unique(entries)
+        try:
+            with transaction.atomic():
+                return write(remaining) if remaining else []
+        except IntegrityError:
+            for entry in remaining:
+                self.add_error(entry['index'], {'non_field_errors': ['Conflicts with a concurrent write, try again.']})
+            return []
+
+    def create(self, items):
+        return self.write(self.check_unique(self.validate_items(items)), self.write_created)
+
+    def write_created(self, entries):
+        data, m2m_values = self.split_m2m(entries)
+        objs = self.model.objects.bulk_create([self.build(values) for values in data], batch_size=self.chunk_size)
+        if objs[0].pk is None:
+            # MySQL does not return primary keys from bulk inserts; the unique field does
+            by_value = self.model.objects.in_bulk([getattr(obj, self.unique_field) for obj in objs], field_name=self.unique_field)
+            objs = [by_value[getattr(obj, self.unique_field)] for obj in objs]
+        self.write_m2m(objs, m2m_values)
+        self.after_write(objs, created=True)
+        return objs
+
+    def update(self, items):
+        ids = self.item_ids(items)
+        instances = self.get_queryset().in_bulk([pk for pk in ids if pk is not None])
+        return self.write(self.check_unique(self.validate_items(items, instances, ids)), self.write_updated)
+
+    def write_updated(self, entries):
+        data, m2m_values = self.split_m2m(entries)
+        # updated_at moves on every updated row, including ones whose only change is an m2m link
+        fields = {'updated_at'} if any(f.name == 'updated_at' for f in self.model._meta.concrete_fields) else set()
+        now = timezone.now()
+        objs = []
+        for entry, values in zip(entries, data):
+            obj = entry['instance']
+            for name, value in values.items():
+                setattr(obj, name, value)
+                fields.add(name)
+            if 'updated_at' in fields:
+                obj.updated_at = now
+            objs.append(obj)
+
+        if fields:
+            self.model.objects.bulk_update(objs, sorted(fields), batch_size=self.chunk_size)
+        self.write_m2m(objs, m2m_values, replace=True)
+        self.after_write(objs, created=False)
+        return objs
+
+    def delete(self, items):
+        # Items as in PATCH ({"id": ...}); bare ids are accepted too
+        items = [item if isinstance(item, dict) else {'id': item} for item in items]
+        ids = self.item_ids(items)
+        instances = self.get_queryset().in_bulk([pk for pk in ids if pk is not None])
+        allowed = []
+        for index, pk in enumerate(ids):
+            if pk is None:
+                continue
+            obj = instances.get(pk)
+            if obj is None:
+                self.add_error(index, {'id': [f'Object with id {pk} does not exist.']})
+            elif not self.has_object_permission(obj):
+                self.add_error(index, {'detail': 'You do not have permission to perform this action.'})
+            else:
+                allowed.append(pk)
+        if allowed:
+            with transaction.atomic():
+                self.model.objects.filter(pk__in=allowed).delete()
+        return allowed
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def serialize(self, objs):
+        order = {obj.pk: position for position, obj in enumerate(objs)}
+        queryset = self.output_serializer_class.setup_eager_loading(self.model.objects.filter(pk__in=order))
+        objs = sorted(queryset, key=lambda obj: order[obj.pk])
+        return [{'id': obj.pk, **item} for obj, item in zip(objs, self.output_serializer_class(objs, many=True).data)]
+
+    def response(self, payload, success_status):
+        if self.errors:
+            payload['errors'] = sorted(self.errors, key=lambda error: error['index'])
+            success_status = status.HTTP_207_MULTI_STATUS if any(payload[key] for key in payload if key != 'errors') \
+                else status.HTTP_400_BAD_REQUEST
+        return Response(payload, status=success_status)
+
+    def dispatch(self):
+        """Run the bulk operation matching the request method and build the response."""
+        data = self.request.data
+        if self.request.method == 'DELETE':
+            if isinstance(data, dict):
+                data = data.get('ids')
+        if not isinstance(data, list):
+            return Response({'error': 'Expected a list payload.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(data) > MAX_ITEMS:
+            return Response({'error': f'At most {MAX_ITEMS} items per request.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if self.request.method == 'POST':
+            return self.response({'created': self.serialize(self.create(data))}, status.HTTP_201_CREATED)
+        if self.request.method == 'PATCH':
+            return self.response({'updated': self.serialize(self.update(data))}, status.HTTP_200_OK)
+        return self.response({'deleted': self.delete(data)}, status.HTTP_200_OK)
+
+
+class TaskBulkWriter(BulkWriter):
+    model = Task
+    serializer_class = TaskBulkSerializer
+    output_serializer_class = TaskModelSerializer
+    m2m_fields = ('categories',)
+
+    def get_queryset(self):
+        return Task.objects.select_related('owner')
+
+    def after_write(self, objs, created):
+        # bulk_create/bulk_update send no model signals
+        if not created:
+            enqueue_status_change([obj for obj in objs if obj.has_changed('status')])
+        transaction.on_commit(invalidate_task_stats)
+        bump_generation(Task)
+
+
+class SubTaskBulkWriter(BulkWriter):
+    model = SubTask
+    serializer_class = SubTaskBulkSerializer
+    output_serializer_class = SubTaskCreateSerializer
+
+    def after_write(self, objs, created):
+        bump_generation(SubTask)
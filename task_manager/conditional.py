@@ -0,0 +1,107 @@
+import hashlib
+from collections import namedtuple
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .response_cache import get_generations
+
+
+class Validators(namedtuple('Validators', ['etag', 'last_modified', 'check_last_modified'])):
+    """
+    ETag and Last-Modified of a representation. If-Modified-Since is only honoured
+    when no row can drop out of the representation without moving Last-Modified.
+    """
+
+
+def build_validators(request, last_modified, *parts, check_last_modified=True):
+    source = '|'.join(str(part) for part in (
+        request.get_full_path(),
+        getattr(request, 'accepted_media_type', ''),
+        last_modified.isoformat() if last_modified else '',
+        *parts,
+    ))
+    return Validators('W/' + quote_etag(hashlib.sha1(source.encode()).hexdigest()), last_modified, check_last_modified)
+
+
+def queryset_validators(request, queryset, field='updated_at', generations=()):
+    """
+    Validators of a list from MAX(field) and COUNT(*), without loading or serializing rows.
+    `generations` are response-cache generations of models rendered inside the rows, like
+    M2M links, whose changes move neither figure.
+    """
+    result = queryset.order_by().aggregate(last_modified=Max(field), count=Count('pk'))
+    # A deleted row lowers the count but leaves MAX(field) alone, so only the ETag is checked
+    return build_validators(request, result['last_modified'], result['count'], *generations,
+                            check_last_modified=False)
+
+
+def not_modified_response(request, validators):
+    """304 (or 412) when the request's preconditions match `validators`, None otherwise."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    last_modified = None
+    if validators.check_last_modified and validators.last_modified:
+        last_modified = int(validators.last_modified.timestamp())
+    response = get_conditional_response(request, etag=validators.etag, last_modified=last_modified)
+    if response is not None:
+        apply_validators(response, validators)
+    return response
+
+
+def apply_validators(response, validators):
+    if response.status_code in (200, 304):
+        response.setdefault('ETag', validators.etag)
+        if validators.last_modified:
+            response.setdefault('Last-Modified', http_date(validators.last_modified.timestamp()))
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Answers conditional GETs on list and retrieve with 304 before the page or object
+    is loaded and serialized. Lists are validated by MAX(updated_at) and COUNT(*) of
+    the filtered queryset, details by the row's own updated_at.
+    """
+    last_modified_field = 'updated_at'
+    related_last_modified = ()  # reverse relations rendered inside the detail representation
+    # Models whose response-cache generation goes into the ETag: M2M links (bumped on m2m_changed)
+    # and related rows change without moving the rows' own updated_at
+    etag_generations = ()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        validators = queryset_validators(request, queryset, self.last_modified_field,
+                                         get_generations(self.etag_generations))
+        return not_modified_response(request, validators) or \
+            apply_validators(super().list(request, *args, **kwargs), validators)
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_object_validators(request)
+        if validators is None:
+            # Missing row: let get_object() raise the usual 404
+            return super().retrieve(request, *args, **kwargs)
+        return not_modified_response(request, validators) or \
+            apply_validators(super().retrieve(request, *args, **kwargs), validators)
+
+    def get_object_validators(self, request):
+        field = self.last_modified_field
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_queryset().prefetch_related(None).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        aggregates = {'last_modified': Max(field)}
+        for name in self.related_last_modified:
+            aggregates[f'{name}_last_modified'] = Max(f'{name}__{field}')
+            aggregates[f'{name}_count'] = Count(name)
+        row = queryset.order_by().values('pk').annotate(**aggregates).first()
+        if row is None:
+            return None
+
+        related = [row[f'{name}_last_modified'] for name in self.related_last_modified]
+        last_modified = max(value for value in [row['last_modified'], *related] if value is not None)
+        counts = [row[f'{name}_count'] for name in self.related_last_modified]
+        return build_validators(request, last_modified, row['pk'], *related, *counts,
+                                *get_generations(self.etag_generations),
+                                check_last_modified=not (self.related_last_modified or self.etag_generations))
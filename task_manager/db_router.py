@@ -0,0 +1,177 @@
+import logging
+import random
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+logger = logging.getLogger('task_manager.db_router')
+
+MAX_LAG = getattr(settings, 'REPLICA_MAX_LAG', 5)
+CHECK_INTERVAL = getattr(settings, 'REPLICA_CHECK_INTERVAL', 5)
+STICKY_SECONDS = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+STICKY_COOKIE = getattr(settings, 'REPLICA_STICKY_COOKIE', 'read_primary')
+READ_METHODS = frozenset(('GET', 'HEAD'))
+
+_state = ContextVar('db_routing', default=None)
+# alias -> (checked at, usable), per process
+_health = {}
+
+
+class RoutingState:
+    """How the current request reads: from a replica at all, and which one it was given."""
+
+    def __init__(self, sticky=False):
+        self.sticky = sticky
+        self.use_replica = False
+        self.wrote = False
+        self.replica = None
+
+
+def get_replicas():
+    # Read on every call: the test runner switches replicas off
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def sqlite_lag(primary, replica):
+    """
+    Local stand-in for replication lag: how far the replica file (a copy made by
+    `manage.py sync_sqlite_replica`) is behind the primary's last write, in seconds.
+    """
+    replica = Path(replica)
+    if not replica.exists():
+        raise DatabaseError(f'SQLite replica {replica} does not exist')
+    return max(0.0, Path(primary).stat().st_mtime - replica.stat().st_mtime)
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary; raises DatabaseError when it can't be reached."""
+    connection = connections[alias]
+    if connection.vendor == 'sqlite':
+        if connection.is_in_memory_db():
+            return 0.0
+        return sqlite_lag(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'], connection.settings_dict['NAME'])
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            # MySQL 8.0.22+ and MariaDB 10.5+; no row means the server is not replicating
+            cursor.execute('SHOW REPLICA STATUS')
+            row = cursor.fetchone()
+            if row is None:
+                return 0.0
+            status = dict(zip((column[0] for column in cursor.description), row))
+            lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+            # NULL while the replication threads are stopped
+            return float('inf') if lag is None else float(lag)
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)')
+            return float(cursor.fetchone()[0])
+    return 0.0
+
+
+def is_usable(alias):
+    """Whether the replica is reachable and within MAX_LAG; checked at most every CHECK_INTERVAL seconds."""
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked is not None and now - checked[0] < CHECK_INTERVAL:
+        return checked[1]
+    try:
+        lag = replica_lag(alias)
+    except DatabaseError as exc:
+        logger.warning('Replica %s is unavailable, reading from the primary: %s', alias, exc)
+        usable = False
+    else:
+        usable = lag <= MAX_LAG
+        if not usable:
+            logger.warning('Replica %s is %.1fs behind, reading from the primary', alias, lag)
+    _health[alias] = (now, usable)
+    return usable
+
+
+def choose_replica():
+    """A random usable replica, or None to read from the primary."""
+    usable = [alias for alias in get_replicas() if is_usable(alias)]
+    return random.choice(usable) if usable else None
+
+
+def begin_request(request):
+    """Start routing a request; returns (state, context token)."""
+    sticky_until = request.COOKIES.get(STICKY_COOKIE, '')
+    state = RoutingState(sticky=sticky_until.isdigit() and int(sticky_until) > time.time())
+    return state, _state.set(state)
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def reads_from_replica(callback, method):
+    """
+    Whether the view opts in for this request: `replica_reads` on the view class lists
+    viewset actions or lower-case HTTP methods; function views use @read_from_replica.
+    """
+    if method not in READ_METHODS:
+        return False
+    view_class = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+    reads = getattr(view_class or callback, 'replica_reads', ())
+    actions = getattr(callback, 'actions', None) or {}
+    return actions.get(method.lower(), method.lower()) in reads
+
+
+def route_view(callback, method):
+    state = _state.get()
+    if state is not None:
+        state.use_replica = reads_from_replica(callback, method)
+
+
+def read_from_replica(view):
+    view.replica_reads = ('get', 'head')
+    return view
+
+
+def remember_write(response, state):
+    """Keep a client that just wrote on the primary for STICKY_SECONDS, so it reads its own writes."""
+    if state.wrote:
+        response.set_cookie(STICKY_COOKIE, str(int(time.time()) + STICKY_SECONDS), max_age=STICKY_SECONDS,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+def served_by_replica():
+    state = _state.get()
+    return state is not None and state.replica not in (None, DEFAULT_DB_ALIAS)
+
+
+def cache_timeout(timeout):
+    """Shortened for data a replica served: it may be older than the generation it gets cached under."""
+    return min(timeout, max(1, int(MAX_LAG))) if served_by_replica() else timeout
+
+
+class ReplicaRouter:
+    """
+    Writes go to the primary. Reads go to a replica only inside a request whose view
+    opted in, and only until that request writes; outside requests, the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or state.sticky or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            # One replica per request, so its reads are consistent with each other
+            state.replica = choose_replica() or DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
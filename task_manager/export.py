@@ -0,0 +1,117 @@
+import csv
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+
+CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+BUFFER_SIZE = 64 * 1024
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+TASK_FIELDS = ('id', 'owner', 'title', 'description', 'status', 'deadline', 'created_at', 'updated_at', 'categories')
+SUBTASK_FIELDS = ('id', 'owner', 'task', 'title', 'description', 'status', 'deadline', 'created_at')
+
+
+def task_row(task):
+    return {
+        'id': task.pk,
+        'owner': task.owner.username,
+        'title': task.title,
+        'description': task.description,
+        'status': task.status,
+        'deadline': task.deadline,
+        'created_at': task.created_at,
+        'updated_at': task.updated_at,
+        'categories': [category.pk for category in task.categories.all()],
+    }
+
+
+def subtask_row(subtask):
+    return {
+        'id': subtask.pk,
+        'owner': subtask.owner.username,
+        'task': subtask.task_id,
+        'title': subtask.title,
+        'description': subtask.description,
+        'status': subtask.status,
+        'deadline': subtask.deadline,
+        'created_at': subtask.created_at,
+    }
+
+
+# kind -> (row builder, its fields in order, select_related, prefetch_related)
+EXPORTS = {
+    'tasks': (task_row, TASK_FIELDS, ('owner',), ('categories',)),
+    'subtasks': (subtask_row, SUBTASK_FIELDS, ('owner',), ()),
+}
+
+
+class _Echo:
+    """File-like object for csv.writer that hands back each line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def _ndjson_lines(rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+def _csv_lines(rows, fields):
+    # The header comes from the field list, so an empty export is still a valid CSV file
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([
+            ';'.join(map(str, value)) if isinstance(value, list) else
+            (value.isoformat() if hasattr(value, 'isoformat') else value)
+            for value in (row[field] for field in fields)
+        ])
+
+
+def stream_export(queryset, kind, fmt='ndjson', compress=False, chunk_size=CHUNK_SIZE):
+    """
+    Yield the encoded export as byte chunks of roughly BUFFER_SIZE.
+    Rows are read with QuerySet.iterator(), so memory stays flat whatever the table size.
+    """
+    to_row, fields, select_related, prefetch_related = EXPORTS[kind]
+    queryset = queryset.select_related(*select_related).prefetch_related(*prefetch_related).order_by('pk')
+    rows = (to_row(obj) for obj in queryset.iterator(chunk_size=chunk_size))
+    lines = _csv_lines(rows, fields) if fmt == 'csv' else _ndjson_lines(rows)
+
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip container
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            chunk = b''.join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b''.join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def export_response(queryset, kind, fmt='ndjson', compress=False):
+    response = StreamingHttpResponse(
+        stream_export(queryset, kind, fmt, compress),
+        content_type='application/gzip' if compress else FORMATS[fmt],
+    )
+    filename = f'{kind}.{fmt}' + ('.gz' if compress else '')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
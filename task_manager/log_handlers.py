@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, the record's extras and any traceback."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            # django.db.backends records carry the statement itself, params already interpolated
+            'message': record.sql if hasattr(record, 'sql') else record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key in RECORD_ATTRIBUTES or key in ('sql', 'params') or key.startswith('_') or value is None:
+                continue
+            if key == 'duration':
+                # django.db.backends reports seconds
+                entry['duration_ms'] = round(value * 1000, 3)
+            else:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Rendered before the record crossed QueueFileHandler's queue
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SlowQueryFilter(logging.Filter):
+    """
+    For django.db.backends: keeps every query slower than `slow_ms` and a random
+    `sample_rate` share of the rest. Records without a duration (schema changes,
+    transaction control) always pass.
+    """
+
+    def __init__(self, slow_ms=100, sample_rate=0.0, name=''):
+        super().__init__(name)
+        self.slow_seconds = slow_ms / 1000
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        duration = getattr(record, 'duration', None)
+        if duration is None or duration >= self.slow_seconds:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+
+class QueueFileHandler(QueueHandler):
+    """
+    File handler that only enqueues on the calling thread. A background QueueListener
+    formats the records and writes them to a rotating file: by size (`max_bytes`) or,
+    when `when` is given, by time as in TimedRotatingFileHandler.
+
+    The queue is bounded; when the writer falls behind, records are dropped and
+    counted in `dropped` rather than blocking the request.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5, when=None, interval=1,
+                 queue_size=10000, encoding='utf-8'):
+        super().__init__(queue.Queue(queue_size))
+        if when:
+            self.target = TimedRotatingFileHandler(filename, when=when, interval=interval,
+                                                   backupCount=backup_count, encoding=encoding, delay=True)
+        else:
+            self.target = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count,
+                                              encoding=encoding, delay=True)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread, in the target handler
+        self.target.setFormatter(fmt)
+
+    def _ensure_listener(self):
+        # Started lazily and again after a fork: the listener thread does not survive it
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record):
+        """
+        Copy the record with its message and traceback already rendered, as QueueHandler
+        does, so the listener never sees args that changed after the call; the request
+        object is replaced by the few fields worth logging.
+        """
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = (self.target.formatter or logging.Formatter()).formatException(record.exc_info)
+            record.exc_info = None
+        request = getattr(record, 'request', None)
+        if request is not None:
+            record.request = None
+            record.method = getattr(request, 'method', None)
+            record.path = getattr(request, 'path', None)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        self._ensure_listener()
+        super().emit(record)
+
+    def flush(self):
+        """Wait until the listener has written everything queued so far."""
+        with self._start_lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+                self._pid = None
+        self.target.flush()
+
+    def close(self):
+        self.flush()
+        self.target.close()
+        super().close()
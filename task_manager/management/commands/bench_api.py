@@ -0,0 +1,242 @@
+import json
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from task_manager import urls
+from task_manager.benchmarking import percentile
+from task_manager.models import Task, SubTask, Category
+from task_manager.response_cache import bump_generation
+
+
+# Query strings that make the filter routes do real work
+QUERY_STRINGS = {
+    'subtask-list-filter': 'task_title=report',
+    'task-list-by-day': 'day=Monday',
+}
+SERVER_TIMING_QUERIES_RE = re.compile(r'db;desc="(\d+) queries"')
+
+
+def write_payloads(user):
+    """POST bodies for the create routes, run with --writes; each call returns a fresh payload."""
+    deadline = (timezone.now() + timedelta(days=7)).isoformat()
+    counter = iter(range(10 ** 9))
+    task = Task.objects.filter(owner=user).first()
+    payloads = {
+        'task-list': lambda: {'title': f'bench task {time.time_ns()}-{next(counter)}', 'deadline': deadline,
+                              'categories': list(Category.objects.values_list('pk', flat=True)[:2])},
+        'category-list': lambda: {'name': f'bench category {time.time_ns()}-{next(counter)}'},
+    }
+    if task is not None:
+        payloads['subtask-list-create'] = lambda: {'title': f'bench subtask {time.time_ns()}-{next(counter)}',
+                                                   'task': task.pk, 'deadline': deadline}
+    return payloads
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every route in task_manager/urls.py, in-process through the test client or against a '
+        'running server (--base-url), and print p50/p95/p99 latency, throughput and queries per request as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', help='Benchmark a running server (e.g. http://127.0.0.1:8000) instead.')
+        parser.add_argument('--username', help='User to authenticate as (defaults to the first superuser or user).')
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per route.')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per route first.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Clients running in parallel threads.')
+        parser.add_argument('--routes', nargs='+', help='Only these URL names.')
+        parser.add_argument('--exclude', nargs='+', default=[], help='Skip these URL names.')
+        parser.add_argument('--cold-cache', action='store_true',
+                            help='Invalidate the cached list responses before every request.')
+        parser.add_argument('--writes', action='store_true',
+                            help='Also POST to the create routes. In-process only; every write is rolled back.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if options['writes'] and options['base_url']:
+            raise CommandError('--writes rolls every request back, which needs the in-process client.')
+        user = self.get_user(options['username'])
+        self.cookie = f'access_token={AccessToken.for_user(user)}'
+        self.host = next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '')), 'localhost')
+        self.base_url = options['base_url'].rstrip('/') if options['base_url'] else None
+
+        scenarios, skipped = self.collect_scenarios(user, options)
+        results = []
+        for name, method, path, payload in scenarios:
+            self.stderr.write(f'{method} {path}')
+            results.append(self.run(name, method, path, payload, options))
+
+        report = {
+            'meta': {
+                'mode': 'server' if self.base_url else 'in-process',
+                'base_url': self.base_url,
+                'database': connection.vendor,
+                'debug': settings.DEBUG,
+                'user': user.username,
+                'requests_per_route': options['requests'],
+                'concurrency': options['concurrency'],
+                'cold_cache': options['cold_cache'],
+                'rows': {'tasks': Task.objects.count(), 'subtasks': SubTask.objects.count(),
+                         'categories': Category.objects.count()},
+                'started_at': timezone.now().isoformat(),
+            },
+            'routes': results,
+            'skipped': skipped,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def get_user(self, username):
+        users = User.objects.filter(is_active=True).order_by('-is_superuser', 'pk')
+        user = users.filter(username=username).first() if username else users.first()
+        if user is None:
+            raise CommandError('No active user to authenticate as (run seed_tasks first).')
+        return user
+
+    def iter_patterns(self, patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from self.iter_patterns(pattern.url_patterns)
+            else:
+                yield pattern
+
+    def allowed_methods(self, callback):
+        actions = getattr(callback, 'actions', None)
+        if actions:
+            return {method.upper() for method in actions}
+        view_class = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+        if view_class is None:
+            # Plain function views are read-only here
+            return {'GET'}
+        return {method.upper() for method in view_class.http_method_names
+                if method != 'options' and hasattr(view_class, method)}
+
+    def object_kwargs(self, pattern, user):
+        if 'pk' not in pattern.pattern.regex.groupindex:
+            return {}
+        view_class = getattr(pattern.callback, 'cls', None)
+        model = getattr(getattr(view_class, 'queryset', None), 'model', None) or Task
+        queryset = model.objects.order_by('pk')
+        owned = queryset.filter(owner=user) if any(field.name == 'owner' for field in model._meta.fields) else queryset
+        pk = owned.values_list('pk', flat=True).first() or queryset.values_list('pk', flat=True).first()
+        return None if pk is None else {'pk': pk}
+
+    def collect_scenarios(self, user, options):
+        scenarios, skipped, seen = [], [], set()
+        payloads = write_payloads(user) if options['writes'] else {}
+        for pattern in self.iter_patterns(urls.urlpatterns):
+            name = pattern.name
+            groups = pattern.pattern.regex.groupindex
+            if not name or name in seen or 'format' in groups:
+                continue
+            seen.add(name)
+            if (options['routes'] and name not in options['routes']) or name in options['exclude']:
+                continue
+            methods = self.allowed_methods(pattern.callback)
+            kwargs = self.object_kwargs(pattern, user)
+            if kwargs is None:
+                skipped.append({'route': name, 'reason': 'no row to address'})
+                continue
+            path = reverse(name, kwargs=kwargs)
+            query = QUERY_STRINGS.get(name)
+            if 'GET' in methods:
+                scenarios.append((name, 'GET', f'{path}?{query}' if query else path, None))
+            if name in payloads and 'POST' in methods:
+                scenarios.append((name, 'POST', path, payloads[name]))
+            elif 'GET' not in methods:
+                skipped.append({'route': name, 'reason': f'write-only ({", ".join(sorted(methods))})'})
+        return scenarios, skipped
+
+    def run(self, name, method, path, payload, options):
+        request = self.server_request if self.base_url else self.client_request
+        clients = {}
+
+        def call(_):
+            if options['cold_cache']:
+                bump_generation(Task, SubTask, Category)
+            started = time.perf_counter()
+            status, queries, cache_status = request(clients, method, path, payload)
+            return time.perf_counter() - started, status, queries, cache_status
+
+        def measure(run_all):
+            run_all(call, range(options['warmup']))
+            started = time.perf_counter()
+            samples = list(run_all(call, range(options['requests'])))
+            return samples, time.perf_counter() - started
+
+        if options['concurrency'] > 1:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                samples, elapsed = measure(lambda function, items: list(pool.map(function, items)))
+        else:
+            samples, elapsed = measure(lambda function, items: [function(item) for item in items])
+
+        latencies = sorted(sample[0] for sample in samples)
+        statuses = Counter(sample[1] for sample in samples)
+        queries = [sample[2] for sample in samples if sample[2] is not None]
+        return {
+            'route': name,
+            'method': method,
+            'path': path,
+            'requests': len(samples),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            'errors': sum(count for status, count in statuses.items() if status >= 400),
+            'rps': round(len(samples) / elapsed, 1),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+            'p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+            'max_queries': max(queries) if queries else None,
+            'cache_hits': sum(1 for sample in samples if sample[3] == 'HIT'),
+        }
+
+    def client_request(self, clients, method, path, payload):
+        # One client per worker thread; each thread has its own database connection
+        client = clients.get(threading.get_ident())
+        if client is None:
+            client = clients[threading.get_ident()] = Client(
+                raise_request_exception=False, HTTP_HOST=self.host, HTTP_COOKIE=self.cookie,
+            )
+        with CaptureQueriesContext(connection) as ctx:
+            if payload is None:
+                response = client.generic(method, path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            else:
+                with transaction.atomic():
+                    response = client.generic(method, path, json.dumps(payload()), content_type='application/json')
+                    transaction.set_rollback(True)
+        return response.status_code, len(ctx.captured_queries), response.headers.get('X-Cache')
+
+    def server_request(self, clients, method, path, payload):
+        request = urllib.request.Request(f'{self.base_url}{path}', method=method, headers={'Cookie': self.cookie})
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status, headers = response.status, response.headers
+        except urllib.error.HTTPError as exc:
+            status, headers = exc.code, exc.headers
+        # Queries come from the Server-Timing header, when the request was sampled
+        match = SERVER_TIMING_QUERIES_RE.search(headers.get('Server-Timing', ''))
+        return status, int(match.group(1)) if match else None, headers.get('X-Cache')
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import RequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from task_manager.benchmarking import percentile
+from task_manager.models import Task
+from task_manager.seeding import seed_tasks
+
+
+# The same sync DRF views are served through both handlers
+ENDPOINTS = {
+    'tasks': '/task_manager/tasks/',
+    'task-detail': '/task_manager/tasks/{pk}/',
+    'subtasks-filter': '/task_manager/subtasks/filter/',
+    'stats': '/task_manager/tasks/stats/',
+    'tasks-by-day': '/task_manager/tasks-by-day/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare WSGI and ASGI throughput of the read endpoints at several concurrency levels. '
+        'Requests are driven in-process straight into the WSGI/ASGI handlers, so the numbers '
+        'cover Django and the app without a web server or network in between.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=ENDPOINTS, default='tasks')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200, 1000])
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per run.')
+        parser.add_argument('--wsgi-threads', type=int, default=16,
+                            help='Worker threads of the simulated threaded WSGI server.')
+        parser.add_argument('--modes', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--seed', type=int, default=0, help='Seed this many tasks first if the table is empty.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        if options['seed'] and not Task.objects.exists():
+            seed_tasks(options['seed'], subtasks_per_task=3)
+        user = User.objects.filter(is_active=True).first()
+        task = Task.objects.first()
+        if user is None or task is None:
+            raise CommandError('Nothing to benchmark: create a user and some tasks (or pass --seed).')
+
+        self.cookie = f'access_token={AccessToken.for_user(user)}'
+        self.host = next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '')), 'localhost')
+        path = ENDPOINTS[options['endpoint']].format(pk=task.pk)
+
+        results = []
+        for concurrency in options['concurrency']:
+            for mode in options['modes']:
+                if mode == 'wsgi':
+                    latencies, errors, elapsed = self.run_wsgi(
+                        path, concurrency, options['requests'], options['wsgi_threads'])
+                else:
+                    latencies, errors, elapsed = asyncio.run(
+                        self.run_asgi(path, concurrency, options['requests']))
+                latencies.sort()
+                results.append({
+                    'mode': mode,
+                    'path': path,
+                    'concurrency': concurrency,
+                    'requests': len(latencies),
+                    'errors': errors,
+                    'rps': round(len(latencies) / elapsed, 1),
+                    'p50_ms': round(statistics.median(latencies) * 1000, 2),
+                    'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+                    'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+                })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f'{"mode":<10} {"conc":>5} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"errors":>7}')
+        for row in results:
+            self.stdout.write(
+                f'{row["mode"]:<10} {row["concurrency"]:>5} {row["rps"]:>9} {row["p50_ms"]:>9} '
+                f'{row["p95_ms"]:>9} {row["p99_ms"]:>9} {row["errors"]:>7}'
+            )
+
+    def run_wsgi(self, path, concurrency, total, threads):
+        """
+        `concurrency` clients share a pool of `threads` workers, like connections queueing
+        on a threaded WSGI server; latency includes the time spent waiting for a worker.
+        """
+        application = get_wsgi_application()
+        factory = RequestFactory()
+
+        def call():
+            environ = factory.get(path, HTTP_HOST=self.host, HTTP_COOKIE=self.cookie).environ
+            status = []
+            body = application(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+            b''.join(body)
+            body.close()
+            return status[0].startswith('200')
+
+        async def drive():
+            loop = asyncio.get_running_loop()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                return await self.drive(lambda: loop.run_in_executor(pool, call), concurrency, total)
+
+        return asyncio.run(drive())
+
+    async def run_asgi(self, path, concurrency, total):
+        application = get_asgi_application()
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', self.host.encode()), (b'cookie', self.cookie.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': (self.host, 80),
+        }
+
+        async def call():
+            messages = []
+            requested = asyncio.Event()
+
+            async def receive():
+                if requested.is_set():
+                    # No disconnect: Django cancels this wait once the response is sent
+                    await asyncio.Event().wait()
+                requested.set()
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            await application(scope, receive, send)
+            return messages[0]['status'] == 200
+
+        return await self.drive(call, concurrency, total)
+
+    async def drive(self, call, concurrency, total):
+        """Run `total` calls with at most `concurrency` in flight; returns (latencies, errors, elapsed)."""
+        latencies = []
+        errors = 0
+        remaining = iter(range(total))
+
+        async def client():
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                ok = await call()
+                latencies.append(time.perf_counter() - started)
+                errors += not ok
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
@@ -0,0 +1,58 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from task_manager.authentication import CachedJWTAuthentication, token_cache
+from task_manager.middleware import JWTAuthenticationMiddleware
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request JWT cookie authentication overhead (middleware + DRF authentication).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='User to authenticate as (defaults to the first active user).')
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        user = users.filter(username=options['username']).first() if options['username'] else users.first()
+        if user is None:
+            raise CommandError('No active user to authenticate as.')
+
+        access_token = str(AccessToken.for_user(user))
+        factory = RequestFactory()
+        middleware = JWTAuthenticationMiddleware(lambda request: HttpResponse())
+        iterations = options['iterations']
+
+        def uncached():
+            # What every request paid before: decode in the middleware, again in DRF, plus a User query
+            request = factory.get('/', HTTP_AUTHORIZATION=f'Bearer {access_token}')
+            AccessToken(access_token)
+            JWTAuthentication().authenticate(Request(request))
+
+        def cached():
+            request = factory.get('/')
+            request.COOKIES['access_token'] = access_token
+            middleware.process_request(request)
+            CachedJWTAuthentication().authenticate(Request(request))
+
+        token_cache.clear()
+        for name, run in (('uncached', uncached), ('cached', cached)):
+            run()  # warm up
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    run()
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{name:<9} {elapsed / iterations * 1e6:8.1f} us/request, '
+                f'{len(queries.captured_queries) / iterations:.2f} queries/request'
+            )
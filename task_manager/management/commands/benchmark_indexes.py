@@ -0,0 +1,132 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db.models import Q
+from django.utils import timezone
+
+from task_manager.models import Task, SubTask
+from task_manager.seeding import seed_tasks
+
+
+# Indexes added for the API's filter/ordering patterns; removed temporarily for the "before" run
+BENCHMARKED_INDEXES = {
+    Task: [
+        'task_status_deadline_idx',
+        'task_owner_created_idx',
+        'task_created_idx',
+    ],
+    SubTask: [
+        'subtask_task_created_idx',
+        'subtask_status_deadline_idx',
+        'subtask_created_id_idx',
+    ],
+}
+
+
+# Not in Task._meta.indexes: migration 0011 keeps it only on backends with partial indexes
+OPEN_DEADLINE_INDEX = models.Index(fields=['deadline'], condition=~Q(status='done'), name='task_open_deadline_idx')
+
+
+def benchmark_queries(using=DEFAULT_DB_ALIAS):
+    tasks, subtasks = Task.objects.using(using), SubTask.objects.using(using)
+    soon = timezone.now() + timedelta(days=7)
+    first_task = tasks.order_by('id').values_list('id', flat=True).first()
+    first_owner = tasks.order_by('id').values_list('owner_id', flat=True).first()
+    return {
+        'task list by status': tasks.filter(status='in_progress').order_by('-created_at')[:5],
+        'task list by status and deadline': tasks.filter(status='new', deadline__lt=soon)[:5],
+        'task list by owner': tasks.filter(owner_id=first_owner).order_by('-created_at')[:5],
+        'overdue count': tasks.filter(Q(deadline__lt=timezone.now().date()) & ~Q(status='done')).order_by(),
+        'subtasks of task': subtasks.filter(task_id=first_task).order_by('-created_at')[:5],
+        'subtask page': subtasks.order_by('-created_at', '-id')[:5],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Show EXPLAIN plans and timings of the list/filter queries with and without the composite indexes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Insert this many tasks before benchmarking.')
+        parser.add_argument('--subtasks-per-task', type=int, default=1)
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the best time is reported.')
+        parser.add_argument('--skip-before', action='store_true', help='Do not drop the indexes for a "before" run.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to benchmark (default: "default").')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Drop the indexes for the "before" run without asking.')
+
+    def handle(self, *args, **options):
+        self.connection = connections[options['database']]
+        if options['seed'] and options['database'] != DEFAULT_DB_ALIAS:
+            raise CommandError('--seed only writes to the default database.')
+        if not options['skip_before'] and options['interactive']:
+            self._confirm(options['database'])
+
+        if options['seed']:
+            started = time.perf_counter()
+            seed_tasks(options['seed'], subtasks_per_task=options['subtasks_per_task'], prefix=f'bench{int(time.time())}')
+            self.stdout.write(f'Seeded {options["seed"]} tasks in {time.perf_counter() - started:.1f}s')
+
+        using = options['database']
+        self.stdout.write(f'Tasks: {Task.objects.using(using).count()}, subtasks: {SubTask.objects.using(using).count()}')
+
+        if not options['skip_before']:
+            self._drop_indexes()
+            try:
+                before = self._run('before', options['repeat'])
+            finally:
+                self._create_indexes()
+        after = self._run('after', options['repeat'])
+
+        if not options['skip_before']:
+            self.stdout.write('\nSummary (best of %d, ms):' % options['repeat'])
+            for name in after:
+                self.stdout.write(f'  {name:<36} {before[name]:>10.2f} -> {after[name]:>10.2f}')
+
+    def _confirm(self, database):
+        answer = input(
+            f'This drops the benchmarked indexes of the "{database}" database ({self.connection.settings_dict["NAME"]}) '
+            'for the "before" run and recreates them afterwards; queries against it run without them meanwhile.\n'
+            "Type 'yes' to continue, or 'no' to cancel: "
+        )
+        if answer != 'yes':
+            raise CommandError('Benchmark cancelled.')
+
+    def _indexes(self):
+        for model, names in BENCHMARKED_INDEXES.items():
+            for index in model._meta.indexes:
+                if index.name in names:
+                    yield model, index
+        if self.connection.features.supports_partial_indexes:
+            yield Task, OPEN_DEADLINE_INDEX
+
+    def _drop_indexes(self):
+        with self.connection.schema_editor() as editor:
+            for model, index in self._indexes():
+                editor.remove_index(model, index)
+
+    def _create_indexes(self):
+        with self.connection.schema_editor() as editor:
+            for model, index in self._indexes():
+                editor.add_index(model, index)
+
+    def _run(self, label, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n=== {label} ==='))
+        timings = {}
+        for name, queryset in benchmark_queries(self.connection.alias).items():
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                # .all() clones the queryset so no run is served from the result cache
+                if queryset.query.is_sliced:
+                    list(queryset.all())
+                else:
+                    queryset.all().count()
+                elapsed = (time.perf_counter() - started) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+            plan = queryset.explain()
+            self.stdout.write(self.style.SQL_TABLE(f'{name}: {best:.2f} ms'))
+            self.stdout.write(f'  {plan}'.replace('\n', '\n  '))
+        return timings
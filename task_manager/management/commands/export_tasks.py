@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from task_manager.export import CHUNK_SIZE, FORMATS, stream_export
+from task_manager.models import Task, SubTask
+
+
+class Command(BaseCommand):
+    help = 'Stream all tasks (or subtasks) as NDJSON or CSV with constant memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=['tasks', 'subtasks'], default='tasks')
+        parser.add_argument('--format', choices=list(FORMATS), default='ndjson', dest='fmt')
+        parser.add_argument('--status')
+        parser.add_argument('--owner', type=int, help='Owner user id.')
+        parser.add_argument('--deadline-after', help='ISO datetime, inclusive.')
+        parser.add_argument('--deadline-before', help='ISO datetime, exclusive.')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('-o', '--output', help='File to write to (defaults to stdout).')
+
+    def handle(self, *args, **options):
+        queryset = (Task if options['model'] == 'tasks' else SubTask).objects.all()
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        if options['owner']:
+            queryset = queryset.filter(owner_id=options['owner'])
+        if options['deadline_after']:
+            queryset = queryset.filter(deadline__gte=options['deadline_after'])
+        if options['deadline_before']:
+            queryset = queryset.filter(deadline__lt=options['deadline_before'])
+
+        chunks = stream_export(queryset, options['model'], options['fmt'], options['gzip'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,45 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from task_manager.models import Task, SubTask, Category
+from task_manager.seeding import seed_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate users, categories, tasks (with category links) and subtasks with chunked bulk inserts. '
+        'Seeded users log in with the password "password".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=10000)
+        parser.add_argument('--subtasks-per-task', type=int, default=3)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--categories-per-task', type=int, default=2,
+                            help='Each task gets between 0 and this many categories.')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk insert and transaction.')
+        parser.add_argument('--prefix', help='Name prefix of the generated rows (defaults to a timestamp).')
+        parser.add_argument('--random-seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix'] or f'seed{int(time.time())}'
+        started = time.perf_counter()
+        seed_tasks(
+            options['tasks'],
+            subtasks_per_task=options['subtasks_per_task'],
+            users=options['users'],
+            categories=options['categories'],
+            categories_per_task=options['categories_per_task'],
+            chunk_size=options['chunk_size'],
+            prefix=prefix,
+            rng=random.Random(options['random_seed']),
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Seeded {options["tasks"]} tasks with prefix "{prefix}" in {elapsed:.1f}s. '
+            f'Totals: {Task.objects.count()} tasks, {SubTask.objects.count()} subtasks, '
+            f'{Category.objects.count()} categories.'
+        )
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from task_manager.notifications import deliver_pending, BATCH_SIZE, MAX_ATTEMPTS
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued task notification emails from the outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when it is empty.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls in --loop mode.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_attempts = options['max_attempts']
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = deliver_pending(batch_size=batch_size, max_attempts=max_attempts)
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Batch delivered: {sent} sent, {failed} failed')
+                continue
+            if not options['loop']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {total_sent} sent, {total_failed} failed'))
@@ -0,0 +1,47 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from task_manager.db_router import get_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into the SQLite replica files (SQLITE_REPLICA_NAME), '
+        'standing in for replication when trying the replica router locally. With --loop the copy '
+        'repeats every --interval seconds, so the replica lags the primary by up to that much.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep copying instead of exiting after one copy.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between copies in --loop mode.')
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('The primary is not SQLite; real replicas replicate on their own.')
+        replicas = [alias for alias in get_replicas() if connections[alias].vendor == 'sqlite']
+        if not replicas:
+            raise CommandError('No SQLite replica configured (set SQLITE_REPLICA_NAME).')
+
+        while True:
+            for alias in replicas:
+                self.copy(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'], connections[alias].settings_dict['NAME'])
+                self.stdout.write(f'Copied the primary into {alias}')
+            if not options['loop']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
+
+    def copy(self, primary, replica):
+        # The backup API takes a consistent snapshot even while the primary is being written
+        source = sqlite3.connect(primary)
+        target = sqlite3.connect(replica)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
@@ -0,0 +1,240 @@
+import bisect
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from rest_framework import serializers
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+from .response_cache import stats as response_cache_stats
+
+
+ENABLED = getattr(settings, 'METRICS_ENABLED', True)
+SAMPLE_RATE = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+SERVER_TIMING = getattr(settings, 'METRICS_SERVER_TIMING', True)
+TOKEN = getattr(settings, 'METRICS_TOKEN', None)
+# Clients allowed to scrape without METRICS_TOKEN
+ALLOWED_IPS = frozenset(getattr(settings, 'METRICS_ALLOWED_IPS', ()))
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+PHASES = ('auth', 'connect', 'db', 'view', 'serialize', 'render')
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Phase durations of one sampled request, in seconds. `connect` (getting a database
+    connection, see task_manager.mysql_backend), `db` and `serialize` overlap the others;
+    `view` is what is left of the request after auth and render.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.active = set()
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+        self.phases['view'] = max(0.0, self.total - self.phases['auth'] - self.phases['render'])
+
+    def server_timing(self):
+        entries = []
+        for phase in PHASES:
+            desc = f';desc="{self.queries} queries"' if phase == 'db' else ''
+            entries.append(f'{phase}{desc};dur={self.phases[phase] * 1000:.1f}')
+        entries.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def begin_request():
+    """Start timing the current request if it is sampled; returns (timings, context token)."""
+    if SAMPLE_RATE < 1 and random.random() >= SAMPLE_RATE:
+        return None, _current.set(None)
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to `phase` of the current request; nested blocks count once."""
+    timings = _current.get()
+    if timings is None or phase in timings.active:
+        yield
+        return
+    timings.active.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[phase] += time.perf_counter() - started
+        timings.active.discard(phase)
+
+
+def time_queries(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection; free for requests that aren't sampled."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.phases['db'] += time.perf_counter() - started
+        timings.queries += 1
+
+
+def install_query_timer(sender=None, connection=None, **kwargs):
+    if time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_queries)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteMetrics:
+    """Per-route request counters and histograms for this process, keyed by URL name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter()
+        self.durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+
+    def record(self, route, method, status, timings):
+        with self._lock:
+            self.requests[(route, method, status)] += 1
+            if timings is None:
+                return
+            self.durations[(route, 'total')].observe(timings.total)
+            for phase, seconds in timings.phases.items():
+                self.durations[(route, phase)].observe(seconds)
+            self.queries[route].observe(timings.queries)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = [
+            '# HELP task_manager_http_requests_total Requests by route, method and status.',
+            '# TYPE task_manager_http_requests_total counter',
+        ]
+        with self._lock:
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'task_manager_http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}'
+                )
+            lines += [
+                '# HELP task_manager_http_request_duration_seconds Time per request phase of sampled requests.',
+                '# TYPE task_manager_http_request_duration_seconds histogram',
+            ]
+            for (route, phase), histogram in sorted(self.durations.items()):
+                lines += _histogram_lines('task_manager_http_request_duration_seconds',
+                                         f'route="{route}",phase="{phase}"', histogram)
+            lines += [
+                '# HELP task_manager_http_request_queries Database queries per sampled request.',
+                '# TYPE task_manager_http_request_queries histogram',
+            ]
+            for route, histogram in sorted(self.queries.items()):
+                lines += _histogram_lines('task_manager_http_request_queries', f'route="{route}"', histogram)
+
+        lines += [
+            '# HELP task_manager_response_cache_requests_total Cached list lookups by view and result.',
+            '# TYPE task_manager_response_cache_requests_total counter',
+        ]
+        for view_name, counts in response_cache_stats.snapshot().items():
+            for result, count in counts.items():
+                lines.append(
+                    f'task_manager_response_cache_requests_total{{view="{view_name}",result="{result}"}} {count}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+    return lines
+
+
+route_metrics = RouteMetrics()
+
+
+def record_request(request, response, timings):
+    match = getattr(request, 'resolver_match', None)
+    route = match.view_name if match else 'unmatched'
+    if timings is not None:
+        timings.finish()
+        if SERVER_TIMING:
+            response['Server-Timing'] = timings.server_timing()
+    method = request.method if request.method in METHODS else 'other'
+    route_metrics.record(route, method, response.status_code, timings)
+    return response
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, for `Authorization: Bearer <METRICS_TOKEN>` or a client
+    in METRICS_ALLOWED_IPS; everyone else gets 403, whatever DEBUG says.
+    """
+    has_token = bool(TOKEN) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {TOKEN}')
+    if not has_token and request.META.get('REMOTE_ADDR') not in ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(route_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """Counts building `.data` as the serialize phase; lists need Meta.list_serializer_class = TimedListSerializer."""
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class TimedBrowsableAPIRenderer(BrowsableAPIRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -1,58 +1,178 @@
 from datetime import datetime
+from asgiref.sync import sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
 from django.utils.deprecation import MiddlewareMixin
-from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
 from rest_framework_simplejwt.exceptions import TokenError
 
+from . import db_router, metrics
+from .authentication import token_cache, refresher, get_token_user, aget_token_user
+
+
+class PerformanceMiddleware(MiddlewareMixin):
+    """
+    Times sampled requests by phase (auth, db, view, serialize, render), reports them
+    in a Server-Timing header and feeds the per-route histograms served on /metrics.
+    Sits right before JWTAuthenticationMiddleware so cookie authentication is included.
+    """
+
+    def __init__(self, get_response):
+        if not metrics.ENABLED:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings, token = metrics.begin_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return metrics.record_request(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = metrics.begin_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return metrics.record_request(request, response, timings)
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Lets GET requests to the views that opt in (`replica_reads`) read from a replica,
+    and keeps a client on the primary for a few seconds after it wrote, through a
+    cookie. Only loaded when DATABASE_REPLICAS is not empty.
+    """
+
+    def __init__(self, get_response):
+        if not db_router.get_replicas():
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state, token = db_router.begin_request(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.end_request(token)
+        return db_router.remember_write(response, state)
+
+    async def __acall__(self, request):
+        state, token = db_router.begin_request(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.end_request(token)
+        return db_router.remember_write(response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        db_router.route_view(view_func, request.method)
 
 
 class JWTAuthenticationMiddleware(MiddlewareMixin):
+    """
+    Authenticates requests from the access_token cookie, refreshing it from the
+    refresh_token cookie when needed. Under ASGI it runs natively on the event loop
+    instead of going through MiddlewareMixin's sync_to_async hop.
+    """
+
     def process_request(self, request):
-        access_token = request.COOKIES.get('access_token')
-        refresh_token = request.COOKIES.get('refresh_token')
-
-        if access_token:
-            try:
-                token = AccessToken(access_token)
-                if datetime.fromtimestamp(token['exp']) < datetime.now():
-                    raise TokenError('Token expired')
-                request.META['HTTP_AUTHORIZATION'] = (f'Bearer {access_token}')
-            except TokenError:
-                new_access_token = self.refresh_access_token(refresh_token)
-                if new_access_token:
-                    request.META['HTTP_AUTHORIZATION'] = (f'Bearer {new_access_token}')
-                    request._new_access_token = new_access_token
-                else:
-                    self.clear_cookies(request)
-        elif refresh_token:
-            new_access_token = self.refresh_access_token(refresh_token)
+        with metrics.timed('auth'):
+            self.authenticate(request)
+
+    def authenticate(self, request):
+        token = self.verify_access_token(request)
+        if token is not None:
+            self.attach_user(request, token)
+        elif self.has_token_cookies(request):
+            new_access_token = self.refresh_access_token(request.COOKIES.get('refresh_token'))
             if new_access_token:
-                request.META['HTTP_AUTHORIZATION'] = (f'Bearer {new_access_token}')
-                request._new_access_token = new_access_token
+                self.use_new_access_token(request, new_access_token)
+                self.attach_user(request, new_access_token)
             else:
                 self.clear_cookies(request)
 
+    async def aprocess_request(self, request):
+        with metrics.timed('auth'):
+            await self.aauthenticate(request)
+
+    async def aauthenticate(self, request):
+        token = self.verify_access_token(request)
+        if token is not None:
+            await self.aattach_user(request, token)
+        elif self.has_token_cookies(request):
+            # The single-flight refresher blocks on locks, so this rare path runs in a thread
+            new_access_token = await sync_to_async(self.refresh_access_token)(request.COOKIES.get('refresh_token'))
+            if new_access_token:
+                self.use_new_access_token(request, new_access_token)
+                await self.aattach_user(request, new_access_token)
+            else:
+                self.clear_cookies(request)
+
+    async def __acall__(self, request):
+        await self.aprocess_request(request)
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def has_token_cookies(self, request):
+        return bool(request.COOKIES.get('access_token') or request.COOKIES.get('refresh_token'))
+
+    def verify_access_token(self, request):
+        access_token = request.COOKIES.get('access_token')
+        if not access_token:
+            return None
+        try:
+            # Verified once per token lifetime; repeat requests hit the LRU
+            token = token_cache.verify(access_token)
+        except TokenError:
+            return None
+        request.META['HTTP_AUTHORIZATION'] = (f'Bearer {access_token}')
+        return token
+
     def refresh_access_token(self, refresh_token):
+        if not refresh_token:
+            return None
         try:
-            refresh = RefreshToken(refresh_token)
-            new_access_token = str(refresh.access_token)
-            return new_access_token
+            # Parallel requests carrying the same expired cookie share one refresh
+            return refresher.refresh(refresh_token)
         except TokenError:
             return None
 
+    def use_new_access_token(self, request, token):
+        raw_token = str(token)
+        request.META['HTTP_AUTHORIZATION'] = (f'Bearer {raw_token}')
+        request._new_access_token = raw_token
+        request._new_access_expiry = token['exp']
+
+    def attach_user(self, request, token):
+        # Picked up by CachedJWTAuthentication, so DRF doesn't verify the token again
+        self.set_user(request, token, get_token_user(token))
+
+    async def aattach_user(self, request, token):
+        self.set_user(request, token, await aget_token_user(token))
+
+    def set_user(self, request, token, user):
+        if user is not None:
+            request.jwt_user = user
+            request.jwt_token = token
+
     def process_response(self, request, response):
         new_access_token = getattr(request, '_new_access_token', None)
         if new_access_token:
-            access_expiry = AccessToken(new_access_token)['exp']
             response.set_cookie(
                 key='access_token',
                 value=new_access_token,
                 httponly=True,
                 secure=False,
                 samesite='Lax',
-                expires=datetime.fromtimestamp(access_expiry),
+                expires=datetime.fromtimestamp(request._new_access_expiry),
             )
         return response
 
     def clear_cookies(self, request):
         request.COOKIES.pop('access_token', None)
-        request.COOKIES.pop('refresh_token', None)
\ No newline at end of file
+        request.COOKIES.pop('refresh_token', None)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import ExtractWeekDay
+
+
+def fill_deadline_weekday(apps, schema_editor):
+    Task = apps.get_model('task_manager', 'Task')
+    Task.objects.using(schema_editor.connection.alias).update(deadline_weekday=ExtractWeekDay('deadline'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_manager', '0004_emailnotification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='deadline_weekday',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='Deadline weekday'),
+        ),
+        migrations.RunPython(fill_deadline_weekday, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['deadline_weekday', '-id'], name='task_weekday_id_idx'),
+        ),
+    ]
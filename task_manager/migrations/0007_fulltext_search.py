@@ -0,0 +1,74 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+FTS_TABLES = {
+    'task_manager_task': ('task_manager_task_fts', ('title', 'description')),
+    'task_manager_subtask': ('task_manager_subtask_fts', ('title', 'description')),
+}
+
+MYSQL_FULLTEXT_INDEXES = [
+    ('task_manager_task', 'task_title_description_ft', ('title', 'description')),
+    ('task_manager_task', 'task_title_ft', ('title',)),
+    ('task_manager_subtask', 'subtask_title_description_ft', ('title', 'description')),
+]
+
+
+def sqlite_fts_statements(table, fts_table, columns):
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    return [
+        # External-content FTS5 table: the text lives only in the base table
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5({column_list}, content='{table}', content_rowid='id', "
+        f"prefix='2 3')",
+        f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER {fts_table}_au AFTER UPDATE OF {column_list} ON {table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')",
+    ]
+
+
+def create_fulltext_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(content)')
+                cursor.execute('DROP TABLE temp.fts5_probe')
+            except OperationalError:
+                # SQLite built without FTS5: search keeps using LIKE
+                return
+        for table, (fts_table, columns) in FTS_TABLES.items():
+            for statement in sqlite_fts_statements(table, fts_table, columns):
+                schema_editor.execute(statement)
+    elif connection.vendor == 'mysql':
+        for table, name, columns in MYSQL_FULLTEXT_INDEXES:
+            schema_editor.execute(f"ALTER TABLE `{table}` ADD FULLTEXT INDEX `{name}` ({', '.join(columns)})")
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        for fts_table, _ in FTS_TABLES.values():
+            for suffix in ('ai', 'ad', 'au'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{suffix}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+    elif connection.vendor == 'mysql':
+        for table, name, _ in MYSQL_FULLTEXT_INDEXES:
+            schema_editor.execute(f'ALTER TABLE `{table}` DROP INDEX `{name}`')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_manager', '0006_task_subtask_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_indexes, drop_fulltext_indexes),
+    ]
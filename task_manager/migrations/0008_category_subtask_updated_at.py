@@ -0,0 +1,57 @@
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+# The sync triggers of 0007_fulltext_search for task_manager_subtask, as they were then
+SUBTASK_FTS_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS task_manager_subtask_fts_ai AFTER INSERT ON task_manager_subtask BEGIN "
+    "INSERT INTO task_manager_subtask_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS task_manager_subtask_fts_ad AFTER DELETE ON task_manager_subtask BEGIN "
+    "INSERT INTO task_manager_subtask_fts(task_manager_subtask_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS task_manager_subtask_fts_au AFTER UPDATE OF title, description ON task_manager_subtask "
+    "BEGIN INSERT INTO task_manager_subtask_fts(task_manager_subtask_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO task_manager_subtask_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+]
+
+
+def fill_subtask_updated_at(apps, schema_editor):
+    SubTask = apps.get_model('task_manager', 'SubTask')
+    SubTask.objects.using(schema_editor.connection.alias).update(updated_at=F('created_at'))
+
+
+def reinstall_fts_triggers(apps, schema_editor):
+    # AddField rebuilds the table on SQLite, which drops the triggers from 0007_fulltext_search
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if 'task_manager_subtask_fts' not in connection.introspection.table_names(cursor):
+            return
+    for statement in SUBTASK_FTS_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_manager', '0007_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='updated at'),
+        ),
+        migrations.AddField(
+            model_name='subtask',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=timezone.now, verbose_name='Updated at'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_subtask_updated_at, migrations.RunPython.noop),
+        migrations.RunPython(reinstall_fts_triggers, migrations.RunPython.noop),
+    ]
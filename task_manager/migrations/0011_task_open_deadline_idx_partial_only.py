@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+OPEN_DEADLINE_INDEX = models.Index(fields=['deadline'], condition=~models.Q(status='done'), name='task_open_deadline_idx')
+
+
+def drop_full_index(apps, schema_editor):
+    # Backends without partial indexes ignored the condition in 0006 and built a plain deadline index
+    if not schema_editor.connection.features.supports_partial_indexes:
+        schema_editor.remove_index(apps.get_model('task_manager', 'Task'), OPEN_DEADLINE_INDEX)
+
+
+def restore_full_index(apps, schema_editor):
+    if not schema_editor.connection.features.supports_partial_indexes:
+        schema_editor.add_index(apps.get_model('task_manager', 'Task'), OPEN_DEADLINE_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_manager', '0010_emailnotification_sending_status'),
+    ]
+
+    operations = [
+        # The index stays in the database where it is partial, but leaves the model state,
+        # so MySQL no longer gets it (or the models.W037 warning)
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(drop_full_index, restore_full_index),
+            ],
+            state_operations=[
+                migrations.RemoveIndex(model_name='task', name='task_open_deadline_idx'),
+            ],
+        ),
+    ]
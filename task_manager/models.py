@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models.functions import ExtractWeekDay
 from django.utils import timezone
 from django.contrib.auth.models import User
+from .tracking import FieldTrackerMixin
 
 # Create your models here.
 
@@ -12,6 +14,7 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     is_deleted = models.BooleanField(default=False, verbose_name='deleted')
     deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='deleted at')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='updated at')
 
     objects = CategoryManager()
     all_objects = models.Manager()
@@ -33,7 +36,42 @@ class Category(models.Model):
         ]
 
 
-class Task(models.Model):
+def deadline_weekday_for(deadline):
+    """Day of week in the ExtractWeekDay numbering: 1 = Sunday ... 7 = Saturday."""
+    if deadline is None:
+        return None
+    if hasattr(deadline, 'resolve_expression'):
+        # e.g. F('deadline') + timedelta(days=1): the database computes both columns
+        return ExtractWeekDay(deadline)
+    if timezone.is_aware(deadline):
+        deadline = timezone.localtime(deadline)
+    return deadline.isoweekday() % 7 + 1
+
+
+class TaskQuerySet(models.QuerySet):
+    """Keeps the denormalized deadline_weekday column in sync on bulk writes."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.deadline_weekday = deadline_weekday_for(obj.deadline)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if 'deadline' in fields:
+            fields = [*fields, 'deadline_weekday']
+            for obj in objs:
+                obj.deadline_weekday = deadline_weekday_for(obj.deadline)
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if 'deadline' in kwargs:
+            kwargs['deadline_weekday'] = deadline_weekday_for(kwargs['deadline'])
+        return super().update(**kwargs)
+
+
+class Task(FieldTrackerMixin, models.Model):
     STATUS_CHOICES = [
         ('new', 'New'),
         ('in_progress', 'In progress'),
@@ -48,9 +86,12 @@ class Task(models.Model):
     categories = models.ManyToManyField(Category, related_name='tasks', verbose_name="Task Categories")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='new', verbose_name="Task Status")
     deadline = models.DateTimeField(verbose_name="Deadline")
+    deadline_weekday = models.PositiveSmallIntegerField(null=True, editable=False, verbose_name="Deadline weekday")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created at")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated at")
 
+    objects = TaskQuerySet.as_manager()
+
     class Meta:
         db_table = 'task_manager_task'
         ordering = ['-created_at']
@@ -59,12 +100,27 @@ class Task(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['title'], name='unique_task_title')
         ]
+        indexes = [
+            models.Index(fields=['deadline_weekday', '-id'], name='task_weekday_id_idx'),
+            models.Index(fields=['status', 'deadline'], name='task_status_deadline_idx'),
+            models.Index(fields=['owner', '-created_at'], name='task_owner_created_idx'),
+            models.Index(fields=['-created_at'], name='task_created_idx'),
+            # The partial deadline index for overdue lookups (open tasks only) is created by
+            # migration 0011, and only on backends that support partial indexes; MySQL doesn't.
+        ]
+
+    def save(self, *args, **kwargs):
+        self.deadline_weekday = deadline_weekday_for(self.deadline)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'deadline' in update_fields and 'deadline_weekday' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'deadline_weekday']
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
 
 
-class SubTask(models.Model):
+class SubTask(FieldTrackerMixin, models.Model):
     STATUS_CHOICES = Task.STATUS_CHOICES  # We use the same statuses
 
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subtasks', verbose_name="SubTask Owner")
@@ -74,6 +130,7 @@ class SubTask(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='new', verbose_name="Task Status")
     deadline = models.DateTimeField(verbose_name="Deadline")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created at")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated at")
 
     class Meta:
         db_table = 'task_manager_subtask'
@@ -83,6 +140,43 @@ class SubTask(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['title'], name='unique_subtask_title')
         ]
+        indexes = [
+            models.Index(fields=['task', '-created_at'], name='subtask_task_created_idx'),
+            models.Index(fields=['status', 'deadline'], name='subtask_status_deadline_idx'),
+            models.Index(fields=['-created_at', '-id'], name='subtask_created_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} (Subtask of {self.task.title})"
+
+class EmailNotification(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    task = models.ForeignKey(Task, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications', verbose_name="Task")
+    recipient = models.EmailField(verbose_name="Recipient")
+    from_email = models.EmailField(verbose_name="From")
+    subject = models.CharField(max_length=255, verbose_name="Subject")
+    body = models.TextField(verbose_name="Body")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Delivery Status")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Attempts")
+    last_error = models.TextField(blank=True, verbose_name="Last error")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Next attempt at")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created at")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Sent at")
+
+    class Meta:
+        db_table = 'task_manager_email_notification'
+        ordering = ['id']
+        verbose_name = 'Email Notification'
+        verbose_name_plural = 'Email Notifications'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_outbox_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.title} (Subtask of {self.task.title})"
\ No newline at end of file
+        return f"{self.subject} -> {self.recipient} ({self.status})"
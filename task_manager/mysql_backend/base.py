@@ -0,0 +1,57 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.mysql import base
+
+from task_manager import metrics
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Django's MySQL backend with an optional connection pool, enabled by
+    OPTIONS['pool'] (True or a dict of ConnectionPool arguments) like Django's
+    PostgreSQL pool. Time spent getting a connection, whether waiting for the
+    pool or opening one, is the request's `connect` phase in task_manager.metrics.
+    """
+
+    def __init__(self, settings_dict, alias=DEFAULT_DB_ALIAS):
+        super().__init__(settings_dict, alias)
+        pool = self.settings_dict['OPTIONS'].get('pool')
+        self.pool_options = None if not pool else ({} if pool is True else dict(pool))
+        self.pool_reused = False
+
+    @property
+    def pool(self):
+        if self.pool_options is None:
+            return None
+        return get_pool(self.alias, ping=lambda connection: connection.ping(False), **self.pool_options)
+
+    def check_settings(self):
+        super().check_settings()
+        if self.pool is not None and self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured('Pooled connections need CONN_MAX_AGE = 0; the pool keeps them open.')
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        with metrics.timed('connect'):
+            if self.pool is None:
+                return super().get_new_connection(conn_params)
+            connect = super().get_new_connection
+            connection, self.pool_reused = self.pool.acquire(lambda: connect(conn_params))
+            return connection
+
+    def init_connection_state(self):
+        # A pooled connection keeps the session settings it got when it was opened
+        if not self.pool_reused:
+            super().init_connection_state()
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        # Connections that saw an error, or are closed mid-transaction, are not handed out again
+        discard = self.errors_occurred or self.in_atomic_block or not self.autocommit
+        self.pool.release(self.connection, discard=discard)
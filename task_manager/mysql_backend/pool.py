@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of DB-API connections for one database alias. Django's
+    per-thread connection takes one when it connects and hands it back when it
+    closes, at the end of every request (CONN_MAX_AGE = 0).
+
+    Connections are reused newest first. Before reuse, a connection older than
+    `max_lifetime` is closed, and one idle for longer than `check_idle` is pinged;
+    if the ping fails it is replaced. When `max_size` connections are in use,
+    callers wait up to `timeout` seconds and then get PoolTimeout.
+    """
+
+    def __init__(self, max_size=10, timeout=10, max_lifetime=3600, check_idle=30, ping=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_idle = check_idle
+        self.ping = ping or (lambda connection: connection.ping())
+        self.pid = os.getpid()
+        self._idle = deque()  # (connection, released at)
+        self._created = {}  # connection -> opened at
+        self._size = 0  # open connections, idle or in use
+        self._condition = threading.Condition()
+
+    def acquire(self, connect):
+        """A pooled connection, or a new one from `connect()`; returns (connection, reused)."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f'No database connection free within {self.timeout}s '
+                                          f'({self.max_size} in use).')
+                    self._condition.wait(remaining)
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                else:
+                    self._size += 1
+                    connection = None
+            # Connecting and pinging happen outside the lock
+            if connection is None:
+                return self._open(connect), False
+            if self._is_usable(connection, released_at):
+                return connection, True
+            self._discard(connection)
+
+    def release(self, connection, discard=False):
+        if discard or self._expired(connection):
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close_all(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    def _open(self, connect):
+        try:
+            connection = connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self._created[connection] = time.monotonic()
+        return connection
+
+    def _expired(self, connection):
+        return time.monotonic() - self._created.get(connection, 0) > self.max_lifetime
+
+    def _is_usable(self, connection, released_at):
+        if self._expired(connection):
+            return False
+        if time.monotonic() - released_at < self.check_idle:
+            return True
+        try:
+            self.ping(connection)
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, connection):
+        self._created.pop(connection, None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, **options):
+    """The pool of `alias` in this process; a forked worker starts its own."""
+    pool = _pools.get(alias)
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None or pool.pid != os.getpid():
+                pool = _pools[alias] = ConnectionPool(**options)
+    return pool
@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import EmailNotification
+
+
+FROM_EMAIL = getattr(settings, 'NOTIFICATION_FROM_EMAIL', 'noreply@ich.com')
+BATCH_SIZE = getattr(settings, 'NOTIFICATION_BATCH_SIZE', 100)
+MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+RETRY_BACKOFF = getattr(settings, 'NOTIFICATION_RETRY_BACKOFF', 60)  # seconds, doubled on every attempt
+MAX_RETRY_DELAY = getattr(settings, 'NOTIFICATION_MAX_RETRY_DELAY', 3600)
+# Seconds a claimed batch may take to send before its unsent rows are claimed again
+SEND_TIMEOUT = getattr(settings, 'NOTIFICATION_SEND_TIMEOUT', 300)
+
+
+def build_status_change_notification(task):
+    """Render the status-change email for a task into an unsaved outbox row."""
+    recipient_email = task.owner.email
+    if not recipient_email:
+        return None
+
+    is_closed = task.status == 'done'
+    subject = f'Task "{task.title}" {"Closed" if is_closed else "Status Changed"}'
+    message = render_to_string('task_manager/email/task_status_change.txt', {
+        'task': task,
+        'new_status': task.get_status_display(),
+        'is_closed': is_closed,
+    })
+    return EmailNotification(
+        task=task,
+        recipient=recipient_email,
+        from_email=FROM_EMAIL,
+        subject=subject,
+        body=message,
+    )
+
+
+def enqueue_status_change(tasks):
+    """Write status-change notifications to the outbox in the caller's transaction."""
+    notifications = [n for n in (build_status_change_notification(task) for task in tasks) if n is not None]
+    if notifications:
+        EmailNotification.objects.bulk_create(notifications)
+    return notifications
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BACKOFF * 2 ** (attempts - 1), MAX_RETRY_DELAY))
+
+
+def claim_batch(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """
+    Take due notifications in a short transaction: mark them `sending`, count the attempt
+    and lease them for SEND_TIMEOUT seconds. If the worker dies while sending, the lease
+    runs out and the rows are claimed again; rows already sent are not.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Interrupted sends that already used their last attempt
+        EmailNotification.objects.filter(
+            status='sending', next_attempt_at__lte=now, attempts__gte=max_attempts,
+        ).update(status='failed', last_error='Interrupted while sending.')
+
+        due = EmailNotification.objects.filter(status__in=('pending', 'sending'), next_attempt_at__lte=now)
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due.order_by('next_attempt_at', 'id')[:batch_size])
+        if not batch:
+            return []
+
+        lease_until = now + timedelta(seconds=SEND_TIMEOUT)
+        EmailNotification.objects.filter(pk__in=[notification.pk for notification in batch]).update(
+            status='sending', attempts=F('attempts') + 1, next_attempt_at=lease_until,
+        )
+    for notification in batch:
+        notification.status = 'sending'
+        notification.attempts += 1
+        notification.next_attempt_at = lease_until
+    return batch
+
+
+def deliver_pending(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """
+    Send one batch of due notifications over a single mail connection, outside any
+    transaction, saving each result as soon as it is known.
+    Returns a (sent, failed) tuple for the batch.
+    """
+    batch = claim_batch(batch_size, max_attempts)
+    if not batch:
+        return 0, 0
+
+    mail_connection = get_connection(fail_silently=False)
+    try:
+        mail_connection.open()
+    except Exception as exc:
+        for notification in batch:
+            _record_failure(notification, exc, max_attempts)
+        return 0, len(batch)
+
+    sent = failed = 0
+    try:
+        for notification in batch:
+            message = EmailMessage(
+                subject=notification.subject,
+                body=notification.body,
+                from_email=notification.from_email,
+                to=[notification.recipient],
+            )
+            try:
+                mail_connection.send_messages([message])
+            except Exception as exc:
+                _record_failure(notification, exc, max_attempts)
+                failed += 1
+            else:
+                _record(notification, status='sent', sent_at=timezone.now(), last_error='')
+                sent += 1
+    finally:
+        mail_connection.close()
+    return sent, failed
+
+
+def _record(notification, **fields):
+    # Only while our claim stands: after the lease ran out another worker owns the row
+    EmailNotification.objects.filter(
+        pk=notification.pk, status='sending', attempts=notification.attempts,
+    ).update(**fields)
+
+
+def _record_failure(notification, exc, max_attempts):
+    error = f'{type(exc).__name__}: {exc}'
+    if notification.attempts >= max_attempts:
+        _record(notification, status='failed', last_error=error)
+    else:
+        _record(notification, status='pending', last_error=error,
+                next_attempt_at=timezone.now() + retry_delay(notification.attempts))
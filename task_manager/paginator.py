@@ -1,12 +1,125 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination, CursorPagination
 
 
+def estimate_count(queryset):
+    """
+    Row count estimate from the query planner or table statistics,
+    or None when the backend can't provide one for this query.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'mysql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            columns = [column[0] for column in cursor.description]
+            row = cursor.fetchone()
+        if row is None or 'rows' not in columns:
+            return None
+        return row[columns.index('rows')]
+
+    if connection.vendor == 'sqlite' and not queryset.query.where:
+        # sqlite_stat1 only exists after ANALYZE; its first number is the table's row count
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [queryset.model._meta.db_table])
+            except Exception:
+                return None
+            row = cursor.fetchone()
+        if row and row[0]:
+            return int(row[0].split()[0])
+    return None
+
+
+class CountStrategy:
+    """
+    Counts a filtered queryset: cached per normalized query for a short TTL,
+    answered from planner estimates above `estimate_threshold` rows, exact otherwise.
+    """
+
+    def __init__(self, timeout=None, estimate_threshold=None):
+        self.timeout = getattr(settings, 'PAGINATION_COUNT_CACHE_TIMEOUT', 30) if timeout is None else timeout
+        self.estimate_threshold = (getattr(settings, 'PAGINATION_ESTIMATE_THRESHOLD', 100_000)
+                                   if estimate_threshold is None else estimate_threshold)
+
+    def cache_key(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.sha1(f'{queryset.db}:{sql}:{params!r}'.encode()).hexdigest()
+        return f'pagination_count:{digest}'
+
+    def count(self, queryset):
+        """Return a (count, is_exact) tuple."""
+        queryset = queryset.order_by()
+        key = self.cache_key(queryset)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        estimate = estimate_count(queryset) if self.estimate_threshold else None
+        if estimate is not None and estimate >= self.estimate_threshold:
+            result = (estimate, False)
+        else:
+            result = (queryset.count(), True)
+        cache.set(key, result, self.timeout)
+        return result
+
+
+class CountingPaginator(Paginator):
+    """Django paginator whose total count goes through a CountStrategy."""
+    count_strategy = CountStrategy()
+    count_is_exact = True
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return len(self.object_list)
+        value, self.count_is_exact = self.count_strategy.count(self.object_list)
+        return value
+
+
 class SubTaskPagination(PageNumberPagination):
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 100
+    django_paginator_class = CountingPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_is_exact'] = self.page.paginator.count_is_exact
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count_is_exact'] = {'type': 'boolean'}
+        return schema
+
 
 class DefaultCursorPagination(CursorPagination):
     page_size = 5
     ordering = '-id'
-    page_size_query_param = None # prohibit changing page_size via request (additional security)
\ No newline at end of file
+    page_size_query_param = None # prohibit changing page_size via request (additional security)
+
+class SubTaskCursorPagination(CursorPagination):
+    """
+    Cursor pagination for clients that page deep into subtask lists: no COUNT(*),
+    and the cursor seeks on created_at. DRF keys the cursor on the first ordering
+    field only; id just makes the order total. Rows sharing the cursor's created_at
+    are skipped with an OFFSET, so long runs of equal timestamps still cost a scan.
+    """
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Break created_at ties on id, in the same direction, so the order is total
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering = (*ordering, '-id' if ordering[0].startswith('-') else 'id')
+        return ordering
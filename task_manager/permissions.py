@@ -12,10 +12,10 @@ class IsOwnerOrReadOnly(BasePermission):
             return True
         if request.method in SAFE_METHODS:
             return True
-        if isinstance(obj, SubTask):
-            owner = getattr(obj, 'owner', None) or getattr(obj.task, 'owner', None)
-        else:
-            owner = getattr(obj, 'owner', None)
-        if owner is not None:
-            return owner == request.user
+        # Compare ids: loading the owner would cost a query per object in bulk writes
+        owner_id = getattr(obj, 'owner_id', None)
+        if owner_id is None and isinstance(obj, SubTask):
+            owner_id = obj.task.owner_id
+        if owner_id is not None:
+            return owner_id == request.user.pk
         return False
\ No newline at end of file
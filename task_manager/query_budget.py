@@ -0,0 +1,182 @@
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.deprecation import MiddlewareMixin
+
+
+logger = logging.getLogger('task_manager.query_budget')
+
+# Query logs of the budgets currently open in this context, outermost first
+_scopes = ContextVar('query_budget_scopes', default=())
+# Every exceeded budget since the last clear(), for the test runner's summary
+violations = []
+
+# Authentication costs one query (the user) when the user cache misses
+AUTH_QUERIES = 1
+# Schema introspection (once per process: search backend, count estimates) and replica
+# health checks (task_manager.db_router) are not counted
+INTROSPECTION_RE = re.compile(
+    r'\b(?:sqlite_master|sqlite_stat1|information_schema|pg_last_xact_replay_timestamp)\b|^\s*SHOW REPLICA STATUS',
+    re.IGNORECASE,
+)
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|(?<![\w\"])-?\d+(?:\.\d+)?\b")
+VALUE_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+def get_mode():
+    """None (off), 'log' (warn about violations) or 'raise' (QueryBudgetExceeded, used by the test runner)."""
+    return getattr(settings, 'QUERY_BUDGET_MODE', None)
+
+
+def normalize_sql(sql):
+    """The statement with literals, placeholders and IN lists collapsed, so N+1 repeats group together."""
+    sql = LITERAL_RE.sub('?', sql.replace('%s', '?'))
+    return ' '.join(VALUE_LIST_RE.sub('(...)', sql).split())
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryLog:
+    def __init__(self, name, budget):
+        self.name = name
+        self.budget = budget
+        self.queries = []
+
+    @property
+    def exceeded(self):
+        return self.budget is not None and len(self.queries) > self.budget
+
+    def grouped(self):
+        """(count, normalized statement) pairs, repeated statements first."""
+        counts = Counter(normalize_sql(sql) for sql in self.queries)
+        return sorted(((count, sql) for sql, count in counts.items()), key=lambda item: -item[0])
+
+    def report(self):
+        lines = [f'{self.name}: {len(self.queries)} queries, budget {self.budget}']
+        lines += [f'  {count}x {sql}' for count, sql in self.grouped()]
+        return '\n'.join(lines)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection; only a context-var lookup while no budget is open."""
+    scopes = _scopes.get()
+    if scopes and not INTROSPECTION_RE.search(sql):
+        for log in scopes:
+            log.queries.append(sql)
+    return execute(sql, params, many, context)
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def track_queries(name, budget=None):
+    """Collect the SQL run inside the block, including by nested budgets and sync_to_async threads."""
+    log = QueryLog(name, budget)
+    token = _scopes.set((*_scopes.get(), log))
+    try:
+        yield log
+    finally:
+        _scopes.reset(token)
+
+
+def check(log, mode=None):
+    mode = mode or get_mode()
+    if not mode or not log.exceeded:
+        return
+    report = log.report()
+    violations.append(report)
+    if mode == 'raise':
+        raise QueryBudgetExceeded(report)
+    logger.warning('Query budget exceeded by %s', report)
+
+
+@contextmanager
+def query_budget_scope(name, budget):
+    mode = get_mode()
+    if not mode:
+        yield None
+        return
+    with track_queries(name, budget) as log:
+        yield log
+    check(log, mode)
+
+
+def query_budget(budget):
+    """
+    Declare the most queries a function (e.g. a signal handler) may run. Async
+    function views are only marked: QueryBudgetMiddleware checks their whole request.
+    """
+    def decorator(func):
+        if iscoroutinefunction(func):
+            func.query_budget = budget
+            return func
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with query_budget_scope(name, budget):
+                return func(*args, **kwargs)
+        wrapper.query_budget = budget
+        return wrapper
+    return decorator
+
+
+def get_view_budget(callback, method):
+    """
+    Budget declared by a view: `query_budgets` on the view class, keyed by viewset
+    action or lower-case HTTP method, or `query_budget` on a function view.
+    """
+    view_class = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+    if view_class is None:
+        return getattr(callback, 'query_budget', None)
+    budgets = getattr(view_class, 'query_budgets', None) or {}
+    actions = getattr(callback, 'actions', None) or {}
+    return budgets.get(actions.get(method.lower(), method.lower()))
+
+
+class QueryBudgetMiddleware(MiddlewareMixin):
+    """
+    Counts the queries of every request (middleware, view and rendering included) and
+    checks them against the budget its view declares. Only loaded when QUERY_BUDGET_MODE is set.
+
+    Streaming responses are exempt: their queries run while the server consumes the body,
+    after this middleware has returned, and an export reads one batch per EXPORT_CHUNK_SIZE
+    rows. Their query counts are covered by tests instead (ExportTests).
+    """
+
+    def __init__(self, get_response):
+        if not get_mode():
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with track_queries(request.path) as log:
+            response = self.get_response(request)
+        return self.check_request(request, response, log)
+
+    async def __acall__(self, request):
+        with track_queries(request.path) as log:
+            response = await self.get_response(request)
+        return self.check_request(request, response, log)
+
+    def check_request(self, request, response, log):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and not response.streaming:
+            log.name = f'{request.method} {match.view_name}'
+            log.budget = get_view_budget(match.func, request.method)
+            check(log)
+        return response
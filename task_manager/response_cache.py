@@ -0,0 +1,126 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+from . import db_router
+
+
+CACHE_ALIAS = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')
+TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def generation_key(model):
+    return f'response_cache:generation:{model._meta.label_lower}'
+
+
+def _new_generation():
+    # Time based, so a generation lost to eviction never revives old entries
+    return time.time_ns()
+
+
+def get_generations(models):
+    if not models:
+        return []
+    cache = _cache()
+    keys = [generation_key(model) for model in models]
+    generations = cache.get_many(keys)
+    missing = {key: _new_generation() for key in keys if key not in generations}
+    if missing:
+        cache.set_many(missing, None)
+        generations.update(missing)
+    return [generations[key] for key in keys]
+
+
+def bump_generation(*models):
+    """
+    Invalidate every cached response built from `models`: entries are keyed by the
+    current generations, so moving them on orphans the old entries in O(1).
+    """
+    def bump():
+        _cache().set_many({generation_key(model): _new_generation() for model in models}, None)
+    bump()
+    # Once more after commit: a reader in between may have cached pre-commit rows under the new generation
+    transaction.on_commit(bump)
+
+
+class CacheStats:
+    """Hit/miss counters per view, for this process."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, view_name, hit):
+        with self._lock:
+            self._counts[(view_name, 'hits' if hit else 'misses')] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        views = {view_name for view_name, _ in counts}
+        return {
+            view_name: {
+                'hits': counts.get((view_name, 'hits'), 0),
+                'misses': counts.get((view_name, 'misses'), 0),
+            }
+            for view_name in sorted(views)
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+class CachedListMixin:
+    """
+    Caches list responses per user, keyed by the view, the normalized query params,
+    the negotiated media type and the generations of `cache_dependencies`.
+    A hit skips every query, including the conditional-GET validators.
+    """
+    cache_dependencies = ()
+    cache_timeout = TIMEOUT
+
+    def get_cache_view_name(self):
+        return f'{self.__class__.__name__}.{getattr(self, "action", None) or "list"}'
+
+    def get_cache_key(self, request):
+        params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+        user = request.user.pk if request.user.is_authenticated else 'anon'
+        generations = get_generations(self.cache_dependencies)
+        source = repr((request.get_host(), request.path, params, request.accepted_media_type, generations))
+        return f'response_cache:{self.get_cache_view_name()}:{user}:{hashlib.sha1(source.encode()).hexdigest()}'
+
+    def list(self, request, *args, **kwargs):
+        cache = _cache()
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        stats.record(self.get_cache_view_name(), hit=cached is not None)
+        if cached is not None:
+            data, headers = cached
+            response = get_conditional_response(request, etag=headers.get('ETag')) \
+                or Response(data, headers={**headers, 'X-Cache': 'HIT'})
+            for name, value in headers.items():
+                response.setdefault(name, value)
+            return response
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200 and isinstance(response, Response):
+            headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+            cache.set(key, (response.data, headers), db_router.cache_timeout(self.cache_timeout))
+            response['X-Cache'] = 'MISS'
+        return response
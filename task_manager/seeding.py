@@ -0,0 +1,144 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Task, SubTask, Category, deadline_weekday_for
+from .response_cache import bump_generation
+from .search import deferred_fulltext_index
+from .stats import invalidate_task_stats
+
+
+# Rough shape of a live board: most work open, a quarter done, a few blocked
+STATUS_WEIGHTS = {'new': 30, 'in_progress': 25, 'pending': 15, 'blocked': 5, 'done': 25}
+WORDS = (
+    'report', 'deploy', 'review', 'invoice', 'meeting', 'backup', 'release', 'design', 'budget', 'client',
+    'migration', 'audit', 'onboarding', 'refactor', 'support', 'training', 'roadmap', 'survey', 'contract', 'sprint',
+)
+TASK_COLUMNS = ('id', 'owner_id', 'title', 'description', 'status', 'deadline', 'deadline_weekday',
+                'created_at', 'updated_at')
+SUBTASK_COLUMNS = ('owner_id', 'task_id', 'title', 'description', 'status', 'deadline', 'created_at', 'updated_at')
+
+
+def insert_rows(model, columns, rows):
+    """
+    executemany() INSERT of plain value tuples. Skips model instances, signals and
+    per-value field preparation, which cost far more than the insert itself at this scale.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table), ', '.join(quote(column) for column in columns), ', '.join(['%s'] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+class HourlyTimestamps:
+    """Timestamps at whole hours from `base`, adapted for the database once per distinct hour."""
+
+    def __init__(self, model, base):
+        self.ops = connections[router.db_for_write(model)].ops
+        self.base = base.replace(minute=0, second=0, microsecond=0)
+        self._values = {}
+
+    def get(self, hours):
+        value = self._values.get(hours)
+        if value is None:
+            moment = self.base + timedelta(hours=hours)
+            value = self._values[hours] = (self.ops.adapt_datetimefield_value(moment), deadline_weekday_for(moment))
+        return value
+
+
+def _description(rng):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(0, 12)))
+
+
+def _deadline_hours(rng, status):
+    if status == 'done':
+        # Finished work is mostly behind us
+        return rng.randint(-90 * 24, 7 * 24)
+    # Open work clusters in the next weeks, with a tail of overdue tasks
+    return int(rng.triangular(-30 * 24, 90 * 24, 10 * 24))
+
+
+def seed_tasks(tasks, subtasks_per_task=0, users=10, categories=0, categories_per_task=2,
+               chunk_size=5000, prefix='seed', rng=None):
+    """
+    Insert `tasks` tasks (and `subtasks_per_task` subtasks each) owned by `users`
+    generated users, linked to up to `categories_per_task` of `categories` generated
+    categories. Statuses, deadlines, creation times and ownership are skewed the way
+    live data is. Task ids are allocated up front, so run it on an idle database.
+    Returns the number of tasks created.
+    """
+    rng = rng or random.Random(0)
+    statuses = list(STATUS_WEIGHTS)
+    status_weights = list(accumulate(STATUS_WEIGHTS.values()))
+    open_statuses = [status for status in statuses if status != 'done']
+    open_weights = list(accumulate(STATUS_WEIGHTS[status] for status in open_statuses))
+    timestamps = HourlyTimestamps(Task, timezone.now())
+
+    with transaction.atomic():
+        password = make_password('password')
+        User.objects.bulk_create(
+            (User(username=f'{prefix}_user_{i}', email=f'{prefix}_user_{i}@example.com', password=password)
+             for i in range(users)),
+            ignore_conflicts=True,
+        )
+        owners = list(User.objects.filter(username__startswith=f'{prefix}_user_').values_list('pk', flat=True))
+        Category.all_objects.bulk_create(
+            (Category(name=f'{prefix} category {i}') for i in range(categories)),
+            ignore_conflicts=True,
+        )
+        category_ids = list(
+            Category.objects.filter(name__startswith=f'{prefix} category ').values_list('pk', flat=True)
+        )
+        next_id = (Task.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+    # A few owners hold most of the tasks
+    owner_weights = list(accumulate(1 / (rank + 1) for rank in range(len(owners))))
+    links_per_task = min(categories_per_task, len(category_ids))
+
+    def add_task(i, task_rows, link_rows, subtask_rows):
+        task_id = next_id + i
+        owner_id = rng.choices(owners, cum_weights=owner_weights)[0]
+        status = rng.choices(statuses, cum_weights=status_weights)[0]
+        deadline_hours = _deadline_hours(rng, status)
+        deadline, weekday = timestamps.get(deadline_hours)
+        created_hours = min(deadline_hours, 0) - rng.randint(1, 60 * 24)
+        created_at = timestamps.get(created_hours)[0]
+        updated_at = timestamps.get(rng.randint(created_hours, 0))[0]
+        title = f'{prefix} task {i}'
+        task_rows.append((task_id, owner_id, title, _description(rng), status, deadline, weekday,
+                          created_at, updated_at))
+        if links_per_task:
+            link_rows.extend((task_id, category_id)
+                             for category_id in rng.sample(category_ids, rng.randint(0, links_per_task)))
+        for n in range(subtasks_per_task):
+            # Subtasks of finished tasks are finished too, and none is due after its task
+            subtask_status = status if status == 'done' else rng.choices(open_statuses, cum_weights=open_weights)[0]
+            subtask_deadline = timestamps.get(deadline_hours - rng.randint(0, 14 * 24))[0]
+            subtask_rows.append((owner_id, task_id, f'{title} / {n}', _description(rng), subtask_status,
+                                 subtask_deadline, created_at, updated_at))
+
+    # Without the per-row FTS triggers on SQLite; the index is rebuilt once afterwards
+    with deferred_fulltext_index(connections[router.db_for_write(Task)]):
+        for start in range(0, tasks, chunk_size):
+            task_rows, link_rows, subtask_rows = [], [], []
+            for i in range(start, min(start + chunk_size, tasks)):
+                add_task(i, task_rows, link_rows, subtask_rows)
+            with transaction.atomic():
+                insert_rows(Task, TASK_COLUMNS, task_rows)
+                if link_rows:
+                    insert_rows(Task.categories.through, ('task_id', 'category_id'), link_rows)
+                if subtask_rows:
+                    insert_rows(SubTask, SUBTASK_COLUMNS, subtask_rows)
+
+    bump_generation(Task, SubTask, Category)
+    # Raw inserts skip the signals that keep the stats counters current
+    invalidate_task_stats()
+    return tasks
@@ -1,13 +1,164 @@
 from datetime import date
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+from rest_framework.utils.field_mapping import get_unique_error_message
+from rest_framework.validators import UniqueValidator
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import Prefetch
+from .metrics import TimedListSerializer, TimedSerializerMixin
 from .models import Task, SubTask, Category
 from django.contrib.auth.models import User
 import re
 
 
-class TaskModelSerializer(serializers.ModelSerializer):
+class EagerLoadingMixin:
+    """
+    Declares the relations a serializer reads, so views can load them
+    up front instead of issuing one query per row.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        prefetch = cls.get_prefetch_related_fields()
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    @classmethod
+    def get_prefetch_related_fields(cls):
+        return cls.prefetch_related_fields
+
+
+def unique_violation_fields(model, exc):
+    """Model fields of the unique constraint an IntegrityError reports, or None for any other integrity error."""
+    message = str(exc)
+    if not re.search(r'unique|duplicate', message, re.IGNORECASE):
+        return None
+    opts = model._meta
+    # MySQL and PostgreSQL name the constraint, SQLite lists table.column
+    candidates = [(constraint.name, list(constraint.fields)) for constraint in opts.constraints
+                  if isinstance(constraint, models.UniqueConstraint) and constraint.fields]
+    candidates += [(None, [field.name]) for field in opts.concrete_fields if field.unique and not field.primary_key]
+    for name, fields in candidates:
+        if name and name in message:
+            return fields
+    for name, fields in candidates:
+        columns = [opts.get_field(field).column for field in fields]
+        if all(re.search(rf"\b{opts.db_table}\.{column}\b|\b{opts.db_table}_{column}_", message)
+               for column in columns):
+            return fields
+    return None
+
+
+class UniqueConstraintMixin:
+    """
+    Leaves uniqueness to the database: no UniqueValidator SELECTs before the write.
+    The write runs in a savepoint, and a violated unique constraint is reported
+    as the same field error the validator would have produced.
+    """
+
+    def build_field(self, field_name, info, model_class, nested_depth):
+        field_class, field_kwargs = super().build_field(field_name, info, model_class, nested_depth)
+        if 'validators' in field_kwargs:
+            field_kwargs['validators'] = [
+                validator for validator in field_kwargs['validators'] if not isinstance(validator, UniqueValidator)
+            ]
+        return field_class, field_kwargs
+
+    def save(self, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError as exc:
+            model = self.Meta.model
+            fields = unique_violation_fields(model, exc)
+            if fields is None:
+                raise
+            if len(fields) == 1:
+                message = get_unique_error_message(model._meta.get_field(fields[0]))
+                raise serializers.ValidationError({fields[0]: [message]}, code='unique')
+            raise serializers.ValidationError(
+                {'non_field_errors': [f'The fields {", ".join(fields)} must make a unique set.']}, code='unique'
+            )
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that resolves ids in bulk: a many=True field costs one
+    filter(pk__in=...) query, and callers validating a whole batch can preload the
+    objects into context['preloaded_related'][field_name] so items cost none.
+    """
+    default_error_messages = {
+        'does_not_exist': 'Invalid pk(s) {pk_values} - object does not exist.',
+        'deleted': 'Deleted pk(s) {pk_values} - object is no longer available.',
+    }
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, value):
+        if self.pk_field is not None:
+            value = self.pk_field.to_internal_value(value)
+        if isinstance(value, (bool, list, dict)):
+            self.fail('incorrect_type', data_type=type(value).__name__)
+        try:
+            return self.get_queryset().model._meta.pk.to_python(value)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(value).__name__)
+
+    def lookup(self, pks, field_name):
+        preloaded = self.context.get('preloaded_related', {}).get(field_name)
+        if preloaded is not None:
+            return {pk: preloaded[pk] for pk in pks if pk in preloaded}
+        return self.get_queryset().in_bulk(pks)
+
+    def resolve(self, values, field_name):
+        """Objects for `values` in submitted order; every unknown id is reported in one error."""
+        pks = list(dict.fromkeys(self.to_pk(value) for value in values))
+        found = self.lookup(pks, field_name)
+        missing = [pk for pk in pks if pk not in found]
+        if missing:
+            errors = []
+            # Soft-deleted rows still exist in the unfiltered manager, so they get their own message
+            all_objects = getattr(self.get_queryset().model, 'all_objects', None)
+            deleted = set(all_objects.filter(pk__in=missing).values_list('pk', flat=True)) if all_objects else set()
+            if len(deleted) < len(missing):
+                errors.append(self.error_messages['does_not_exist'].format(
+                    pk_values=[pk for pk in missing if pk not in deleted]))
+            if deleted:
+                errors.append(self.error_messages['deleted'].format(pk_values=[pk for pk in missing if pk in deleted]))
+            raise serializers.ValidationError(errors, code='does_not_exist')
+        return [found[pk] for pk in pks]
+
+    def to_internal_value(self, data):
+        return self.resolve([data], self.field_name)[0]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return self.child_relation.resolve(data, self.field_name)
+
+
+class TaskModelSerializer(EagerLoadingMixin, TimedSerializerMixin, UniqueConstraintMixin, serializers.ModelSerializer):
+    select_related_fields = ('owner',)
+    prefetch_related_fields = ('categories',)
+
     owner = serializers.StringRelatedField(read_only=True)
-    categories = serializers.PrimaryKeyRelatedField(
+    categories = BulkPrimaryKeyRelatedField(
         queryset=Category.objects.all(),
         many=True,
         required=False
@@ -17,17 +168,22 @@ class TaskModelSerializer(serializers.ModelSerializer):
         model = Task
         fields = ['owner', 'title', 'description', 'status', 'deadline', 'categories']
         read_only_fields = ['owner']
+        list_serializer_class = TimedListSerializer
 
     def create(self, validated_data):
         categories = validated_data.pop('categories', [])
         task = Task.objects.create(**validated_data)  # owner задаётся в view
         if categories:
-            task.categories.set(categories)
+            # Already fetched by the field; a new task has no links to diff against
+            task.categories.add(*categories)
         return task
 
 
-class SubTaskCreateSerializer(serializers.ModelSerializer):
+class SubTaskCreateSerializer(EagerLoadingMixin, TimedSerializerMixin, UniqueConstraintMixin, serializers.ModelSerializer):
+    select_related_fields = ('owner',)
+
     owner = serializers.StringRelatedField(read_only=True)
+    task = BulkPrimaryKeyRelatedField(queryset=Task.objects.all(), label='Main Task')
     created_at = serializers.DateTimeField(read_only=True)
 
 
@@ -35,37 +191,53 @@ class SubTaskCreateSerializer(serializers.ModelSerializer):
         model = SubTask
         fields = ['owner','title', 'description', 'task', 'status', 'deadline', 'created_at']
         read_only_fields = ['owner', 'created_at']
+        list_serializer_class = TimedListSerializer
+
+
+class TaskBulkSerializer(TaskModelSerializer):
+    """
+    Item serializer for the bulk endpoints: title uniqueness is checked and
+    categories are preloaded for the whole batch at once by task_manager.bulk.
+    """
+    id = serializers.IntegerField(required=False)
 
+    class Meta(TaskModelSerializer.Meta):
+        fields = ['id', *TaskModelSerializer.Meta.fields]
 
-class CategoryCreateSerializer(serializers.ModelSerializer):
+
+class SubTaskBulkSerializer(SubTaskCreateSerializer):
+    """Item serializer for bulk subtask writes; the parent tasks are preloaded in one query."""
+    id = serializers.IntegerField(required=False)
+
+    class Meta(SubTaskCreateSerializer.Meta):
+        fields = ['id', *SubTaskCreateSerializer.Meta.fields]
+
+
+class CategoryCreateSerializer(TimedSerializerMixin, UniqueConstraintMixin, serializers.ModelSerializer):
     class Meta:
         model=Category
         fields='__all__'
+        list_serializer_class = TimedListSerializer
 
-    def create(self, validated_data):
-        name = validated_data.get('name')
-        if Category.objects.filter(name=name).exists():
-            raise serializers.ValidationError({'name': f'Category with name {name} already exists'})
-        return super().create(validated_data)
-
-    def update(self, instance, validated_data):
-        name = validated_data.get('name', instance.name)
-        if name != instance.name and Category.objects.filter(name=name).exclude(pk=instance.pk).exists():
-            raise serializers.ValidationError({'name': f'Category with name {name} already exists'})
-        return super().update(instance, validated_data)
 
+class TaskDetailSerializer(EagerLoadingMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    select_related_fields = ('owner',)
 
-class TaskDetailSerializer(serializers.ModelSerializer):
     subtasks = SubTaskCreateSerializer(many=True, read_only=True)
     owner = serializers.StringRelatedField(read_only=True)
 
+    @classmethod
+    def get_prefetch_related_fields(cls):
+        return (Prefetch('subtasks', queryset=SubTaskCreateSerializer.setup_eager_loading(SubTask.objects.all())),)
+
 
     class Meta:
         model = Task
         fields = ['owner','title', 'description', 'status', 'deadline', 'subtasks']
         read_only_fields = ['owner']
+        list_serializer_class = TimedListSerializer
 
-class TaskCreateSerializer(serializers.ModelSerializer):
+class TaskCreateSerializer(UniqueConstraintMixin, serializers.ModelSerializer):
     owner = serializers.StringRelatedField(read_only=True)
 
 
@@ -80,7 +252,7 @@ class TaskCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(UniqueConstraintMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     password2 = serializers.CharField(write_only=True, min_length=8)
 
@@ -89,6 +261,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ['username', 'email', 'password', 'password2']
 
     def validate_email(self, value):
+        # auth_user.email isn't unique, so this check stays; the auth_user_email_idx index serves it
         if User.objects.filter(email=value).exists():
             raise serializers.ValidationError({'email': f'User with email {value} already exists'})
         return value
@@ -105,7 +278,7 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop('password2')  # Удаляем password2, так как оно не нужно для модели
-        user = User.objects.create(
+        user = User(
             username=validated_data['username'],
             email=validated_data['email']
         )
@@ -1,35 +1,68 @@
-from django.db.models.signals import pre_save, post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from .models import Task
+from django.contrib.auth.models import User
+from .models import Task, SubTask, Category
+from .authentication import invalidate_cached_user
+from .query_budget import query_budget
+from .notifications import enqueue_status_change
+from .response_cache import bump_generation
+from .stats import adjust_status_counter, invalidate_overdue
 
 
-@receiver(pre_save, sender=Task)
-def track_status_change(sender, instance, **kwargs):
-    try:
-        old_instance = sender.objects.get(pk=instance.pk)
-        instance._previous_status = old_instance.status
-    except sender.DoesNotExist:
-        instance._previous_status = None
+@receiver(post_save, sender=Task)
+@query_budget(2)
+def send_status_change_notification(sender, instance, created, **kwargs):
+    # Original values come from FieldTrackerMixin, so no pre_save SELECT is needed
+    if not created and instance.has_changed('status'):
+        # The email itself is delivered by `manage.py send_notifications`,
+        # so the request never waits on the mail server.
+        enqueue_status_change([instance])
 
 
 @receiver(post_save, sender=Task)
-def send_status_change_notification(sender, instance, created, **kwargs):
-    if not created and hasattr(instance, '_previous_status') and instance._previous_status != instance.status:
-        is_closed = instance.status == 'done'
-        subject = f'Task "{instance.title}" {"Closed" if is_closed else "Status Changed"}'
-        message = render_to_string('task_manager/email/task_status_change.txt', {
-            'task': instance,
-            'new_status': instance.get_status_display(),
-            'is_closed': is_closed,
-        })
-        recipient_email = instance.owner.email
-
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email='noreply@ich.com',
-            recipient_list=[recipient_email],
-            fail_silently=False,
-        )
\ No newline at end of file
+@query_budget(0)
+def update_stats_counters(sender, instance, created, **kwargs):
+    owner_id, status = instance.owner_id, instance.status
+    if created:
+        transaction.on_commit(lambda: adjust_status_counter(owner_id, status, 1))
+    elif instance.has_changed('status') or instance.has_changed('owner'):
+        old_owner_id = instance.get_original('owner') or owner_id
+        old_status = instance.get_original('status') or status
+
+        def move_counter():
+            adjust_status_counter(old_owner_id, old_status, -1)
+            adjust_status_counter(owner_id, status, 1)
+        transaction.on_commit(move_counter)
+    elif instance.has_changed('deadline'):
+        transaction.on_commit(lambda: invalidate_overdue(owner_id))
+
+
+@receiver(post_delete, sender=Task)
+@query_budget(0)
+def remove_from_stats_counters(sender, instance, **kwargs):
+    owner_id, status = instance.owner_id, instance.get_original('status') or instance.status
+    transaction.on_commit(lambda: adjust_status_counter(owner_id, status, -1))
+
+
+@receiver([post_save, post_delete], sender=Task)
+@receiver([post_save, post_delete], sender=SubTask)
+@receiver([post_save, post_delete], sender=Category)
+@query_budget(0)
+def invalidate_cached_responses(sender, **kwargs):
+    bump_generation(sender)
+
+
+@receiver(m2m_changed, sender=Task.categories.through)
+@query_budget(0)
+def invalidate_cached_task_categories(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_generation(Task, Category)
+
+
+@receiver([post_save, post_delete], sender=User)
+@query_budget(0)
+def drop_cached_user(sender, instance, **kwargs):
+    # After commit, or a request in between could cache the old row again
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
@@ -0,0 +1,196 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncWeek
+from django.utils.timezone import now
+
+from .models import Task
+
+
+COUNTERS_TIMEOUT = getattr(settings, 'TASK_STATS_COUNTERS_TIMEOUT', 60 * 60)
+OVERDUE_TIMEOUT = getattr(settings, 'TASK_STATS_OVERDUE_TIMEOUT', 30)
+
+STATUSES = [value for value, _ in Task.STATUS_CHOICES]
+VERSION_KEY = 'task_stats:version'
+
+
+def _new_version():
+    # Time based, so a version key lost to eviction never revives stale counters
+    return time.time_ns()
+
+
+def _scope(owner_id=None):
+    return 'all' if owner_id is None else f'owner:{owner_id}'
+
+
+def _scope_version_key(scope):
+    return f'task_stats:version:{scope}'
+
+
+def _prefix(scope):
+    # The scope version moves when a counter change can't be applied (see adjust_status_counter),
+    # so a cold-cache fill racing with that change stores its counters under a key nobody reads.
+    version = cache.get_or_set(VERSION_KEY, _new_version, None)
+    scope_version = cache.get_or_set(_scope_version_key(scope), _new_version, None)
+    return f'task_stats:v{version}.{scope_version}:{scope}'
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+class StatsQuery:
+    """
+    Builds task statistics as conditional aggregates, one SQL statement per call:
+    a COUNT(... FILTER (WHERE status = ...)) for every Task.STATUS_CHOICES value, plus overdue.
+    """
+
+    GROUP_BY = {
+        'owner': F('owner__username'),
+        'category': F('categories__name'),
+        'week': TruncWeek('deadline'),
+    }
+    # Joins through categories skip the default manager, so soft-deleted categories are filtered here.
+    # The inner join also leaves out tasks without a live category: there is no None group.
+    GROUP_FILTERS = {
+        'category': Q(categories__is_deleted=False),
+    }
+
+    def __init__(self, queryset=None):
+        self.queryset = (Task.objects.all() if queryset is None else queryset).order_by()
+
+    @staticmethod
+    def overdue_filter():
+        return Q(deadline__lt=now().date()) & ~Q(status='done')
+
+    def aggregates(self, overdue=True):
+        aggregates = {'total_tasks': Count('id')}
+        for value in STATUSES:
+            aggregates[f'status_{value}'] = Count('id', filter=Q(status=value))
+        if overdue:
+            aggregates['overdue_tasks'] = Count('id', filter=self.overdue_filter())
+        return aggregates
+
+    @staticmethod
+    def format_row(row):
+        return {
+            'total_tasks': row['total_tasks'],
+            'status_counts': {value: row[f'status_{value}'] for value in STATUSES if row[f'status_{value}']},
+            'overdue_tasks': row.get('overdue_tasks'),
+        }
+
+    def overdue_count(self):
+        return self.queryset.filter(self.overdue_filter()).count()
+
+    def summary(self):
+        return self.format_row(self.queryset.aggregate(**self.aggregates()))
+
+    def grouped_queryset(self, group_by):
+        if group_by not in self.GROUP_BY:
+            raise ValueError(f'group_by must be one of: {", ".join(self.GROUP_BY)}')
+        queryset = self.queryset
+        if group_by in self.GROUP_FILTERS:
+            queryset = queryset.filter(self.GROUP_FILTERS[group_by])
+        return (
+            queryset
+            .values(group=self.GROUP_BY[group_by])
+            .annotate(**self.aggregates())
+            .order_by('group')
+        )
+
+    def grouped(self, group_by):
+        return [{group_by: row['group'], **self.format_row(row)} for row in self.grouped_queryset(group_by)]
+
+
+def _scoped_tasks(owner_id=None):
+    tasks = Task.objects.all()
+    if owner_id is not None:
+        tasks = tasks.filter(owner_id=owner_id)
+    return tasks
+
+
+def _status_keys(prefix):
+    return [f'{prefix}:ready'] + [f'{prefix}:status:{value}' for value in STATUSES]
+
+
+def _cached_status_counts(prefix, cached):
+    if f'{prefix}:ready' in cached and len(cached) == len(_status_keys(prefix)):
+        return {value: cached[f'{prefix}:status:{value}'] for value in STATUSES}
+    return None
+
+
+def _counter_entries(prefix, counts):
+    return {f'{prefix}:status:{value}': count for value, count in counts.items()}
+
+
+def _format_stats(counts, overdue_tasks):
+    return {
+        'total_tasks': sum(counts.values()),
+        'status_counts': {value: count for value, count in counts.items() if count},
+        'overdue_tasks': overdue_tasks,
+    }
+
+
+def get_task_stats(owner_id=None):
+    """
+    Task statistics, optionally scoped to one owner.
+    Per-status counters are maintained incrementally by signals;
+    only the time-dependent overdue figure is recomputed, on a short TTL.
+    """
+    prefix = _prefix(_scope(owner_id))
+    overdue_key = f'{prefix}:overdue'
+    query = StatsQuery(_scoped_tasks(owner_id))
+
+    counts = _cached_status_counts(prefix, cache.get_many(_status_keys(prefix)))
+    if counts is None:
+        # Cold cache: counters and overdue come from a single aggregate statement
+        row = query.queryset.aggregate(**query.aggregates())
+        counts = {value: row[f'status_{value}'] for value in STATUSES}
+        cache.set_many(_counter_entries(prefix, counts), COUNTERS_TIMEOUT)
+        cache.set(overdue_key, row['overdue_tasks'], OVERDUE_TIMEOUT)
+        # The marker goes last: counters are only trusted once all of them are stored
+        cache.set(f'{prefix}:ready', True, COUNTERS_TIMEOUT)
+
+    overdue_tasks = cache.get(overdue_key)
+    if overdue_tasks is None:
+        overdue_tasks = query.overdue_count()
+        cache.set(overdue_key, overdue_tasks, OVERDUE_TIMEOUT)
+
+    return _format_stats(counts, overdue_tasks)
+
+
+def get_grouped_task_stats(group_by, owner_id=None):
+    """Uncached per-group statistics for reporting (?group_by=owner|category|week)."""
+    return StatsQuery(_scoped_tasks(owner_id)).grouped(group_by)
+
+
+def adjust_status_counter(owner_id, status, delta):
+    """
+    Apply a committed status change to the cached counters. A scope that isn't ready may
+    have a cold-cache fill in flight whose aggregate predates this change, so its version
+    moves instead and the next read recomputes it.
+    """
+    for scope in (_scope(), _scope(owner_id)):
+        prefix = _prefix(scope)
+        cache.delete(f'{prefix}:overdue')
+        if not cache.get(f'{prefix}:ready'):
+            _bump(_scope_version_key(scope))
+            continue
+        try:
+            cache.incr(f'{prefix}:status:{status}', delta)
+        except ValueError:
+            _bump(_scope_version_key(scope))
+
+
+def invalidate_overdue(owner_id):
+    cache.delete_many([f'{_prefix(scope)}:overdue' for scope in (_scope(), _scope(owner_id))])
+
+
+def invalidate_task_stats():
+    """Drop every cached scope at once, for writes that bypass model signals (queryset.update, bulk_create)."""
+    _bump(VERSION_KEY)
@@ -0,0 +1,34 @@
+import sys
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from . import query_budget
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """
+    Runs the suite with QUERY_BUDGET_MODE='raise', so a view or signal handler that
+    goes over its declared query budget fails the test that triggered it, and lists
+    every violation with its SQL grouped by normalized statement at the end.
+
+    Reads stay on the primary: a replica's test mirror is a separate connection
+    that can't see the rows a TestCase has not committed.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.query_budget_settings = override_settings(QUERY_BUDGET_MODE='raise', DATABASE_REPLICAS=[])
+        self.query_budget_settings.enable()
+        query_budget.violations.clear()
+
+    def teardown_test_environment(self, **kwargs):
+        self.query_budget_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def suite_result(self, suite, result, **kwargs):
+        if query_budget.violations:
+            sys.stderr.write(f'\nQuery budgets exceeded ({len(query_budget.violations)}):\n')
+            for report in query_budget.violations:
+                sys.stderr.write(f'{report}\n')
+        return super().suite_result(suite, result, **kwargs)
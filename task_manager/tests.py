@@ -1,3 +1,1380 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import logging
+import os
+import runpy
+import smtplib
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.test import AsyncClient, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import db_router, metrics, notifications, query_budget, seeding, signals, stats
+from .authentication import SingleFlightRefresher, VerifiedTokenCache, get_cached_user, user_cache_key
+from .bulk import TaskBulkWriter
+from .export import SUBTASK_FIELDS, TASK_FIELDS
+from .log_handlers import JSONFormatter, QueueFileHandler, SlowQueryFilter
+from .models import Task, SubTask, Category, EmailNotification, deadline_weekday_for
+from .mysql_backend.pool import ConnectionPool, PoolTimeout
+from .paginator import CountingPaginator, CountStrategy
+from .response_cache import stats as response_cache_stats
+from .search import full_text_search
+from .serializers import TaskModelSerializer
+from .stats import StatsQuery, get_task_stats
+from .views import SubTaskListCreateView, TaskViewSet
+
+
+def seed_tasks(owner, count, categories=(), subtasks_per_task=0):
+    """Create `count` tasks with M2M categories and subtasks in a handful of queries."""
+    deadline = timezone.now() + timedelta(days=7)
+    tasks = Task.objects.bulk_create(
+        Task(owner=owner, title=f'Task {owner.pk}-{i}', deadline=deadline) for i in range(count)
+    )
+    Task.categories.through.objects.bulk_create(
+        Task.categories.through(task_id=task.pk, category_id=category.pk)
+        for task in tasks for category in categories
+    )
+    SubTask.objects.bulk_create(
+        SubTask(owner=owner, task=task, title=f'SubTask {task.pk}-{i}', deadline=deadline)
+        for task in tasks for i in range(subtasks_per_task)
+    )
+    return tasks
+
+
+class APITestCase(TestCase):
+    """
+    An `owner` user, a client authenticated as them and an empty cache: seed_tasks() bulk-creates,
+    which bumps neither response-cache generations nor stats counters.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', 'owner@example.com', 'pass1234')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class QueryCountAssertionsMixin:
+    """Helpers that fail when the number of queries grows with the number of rows."""
+
+    page_sizes = (5, 100, 1000)
+
+    def assertQueryCountForPages(self, expected, run, **seed_kwargs):
+        for size in self.page_sizes:
+            with self.subTest(tasks=size):
+                Task.objects.all().delete()
+                seed_tasks(self.user, size, **seed_kwargs)
+                with CaptureQueriesContext(connection) as ctx:
+                    run()
+                self.assertEqual(
+                    len(ctx.captured_queries), expected,
+                    f'{size} tasks took {len(ctx.captured_queries)} queries, expected {expected}:\n' +
+                    '\n'.join(query['sql'] for query in ctx.captured_queries)
+                )
+
+    def serialize_action(self, action, pk=None):
+        """Serialize the whole planned queryset of a TaskViewSet action (no pagination)."""
+        request = APIRequestFactory().get('/')
+        request.user = self.user
+        view = TaskViewSet(action=action, request=request, format_kwarg=None, kwargs={})
+        queryset = view.get_queryset()
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+        return view.get_serializer(queryset, many=True).data
+
+
+class TaskQueryPlanningTests(QueryCountAssertionsMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+
+    def test_list_serializer_query_count_is_constant(self):
+        # tasks + categories prefetch
+        self.assertQueryCountForPages(2, lambda: self.serialize_action('list'), categories=self.categories)
+
+    def test_detail_serializer_query_count_is_constant(self):
+        # tasks + subtasks prefetch (with owners joined)
+        self.assertQueryCountForPages(2, lambda: self.serialize_action('retrieve'), subtasks_per_task=2)
+
+    def test_list_endpoint_query_count_is_constant(self):
+        url = reverse('task-list')
+        # validators + tasks + categories prefetch
+        self.assertQueryCountForPages(3, lambda: self.client.get(url), categories=self.categories)
+
+    def test_detail_endpoint_query_count(self):
+        task = seed_tasks(self.user, 1, subtasks_per_task=10)[0]
+        with self.assertNumQueries(3):  # validators + task + subtasks prefetch
+            response = self.client.get(reverse('task-detail', args=[task.pk]))
+        self.assertEqual(len(response.data['subtasks']), 10)
+
+    def test_tasks_by_day_serializes_only_the_page(self):
+        day = timezone.localtime(timezone.now() + timedelta(days=7)).strftime('%A')
+        url = reverse('task-list-by-day')
+        # validators + tasks + categories prefetch
+        self.assertQueryCountForPages(3, lambda: self.client.get(url, {'day': day}), categories=self.categories)
+
+        serialize = TaskModelSerializer.to_representation
+        with mock.patch.object(TaskModelSerializer, 'to_representation', autospec=True, side_effect=serialize) as spy:
+            response = self.client.get(url, {'day': day})
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(spy.call_count, 5)
+
+
+class DeadlineWeekdayTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(owner=self.user, title='A', deadline=timezone.now() + timedelta(days=1))
+
+    def assertWeekdayMatchesDeadline(self):
+        task = Task.objects.get(pk=self.task.pk)
+        self.assertEqual(task.deadline_weekday, deadline_weekday_for(task.deadline))
+
+    def test_save_with_update_fields_keeps_weekday(self):
+        self.task.deadline += timedelta(days=1)
+        self.task.save(update_fields=['deadline'])
+        self.assertWeekdayMatchesDeadline()
+
+    def test_update_with_expression_keeps_weekday(self):
+        Task.objects.filter(pk=self.task.pk).update(deadline=F('deadline') + timedelta(days=1))
+        self.assertWeekdayMatchesDeadline()
+
+
+class FieldTrackerTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.task_pk = seed_tasks(cls.user, 1)[0].pk
+
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.get(pk=self.task_pk)
+
+    def test_has_changed_and_changed_fields(self):
+        self.assertEqual(self.task.changed_fields, [])
+        self.task.status = 'in_progress'
+        self.task.description = 'Details'
+        self.assertTrue(self.task.has_changed('status'))
+        self.assertFalse(self.task.has_changed('title'))
+        self.assertEqual(self.task.get_original('status'), 'new')
+        self.assertEqual(self.task.changed_fields, ['description', 'status'])
+
+        self.task.status = 'new'
+        self.assertEqual(self.task.changed_fields, ['description'])
+
+    def test_save_writes_only_changed_columns(self):
+        self.task.status = 'in_progress'
+        with CaptureQueriesContext(connection) as ctx:
+            self.task.save()
+        update, = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('UPDATE "task_manager_task"')]
+        assigned = update.split(' SET ')[1].split(' WHERE ')[0]
+        self.assertIn('"status"', assigned)
+        self.assertIn('"updated_at"', assigned)
+        self.assertNotIn('"title"', assigned)
+        self.assertNotIn('"description"', assigned)
+        # Saved values become the new originals
+        self.assertEqual(self.task.changed_fields, [])
+
+    def test_status_change_notifies_without_pre_save_select(self):
+        self.task.status = 'done'
+        with CaptureQueriesContext(connection) as ctx:
+            self.task.save()
+        selects = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertFalse([sql for sql in selects if 'FROM "task_manager_task"' in sql], selects)
+        notification, = EmailNotification.objects.all()
+        self.assertEqual(notification.recipient, 'owner@example.com')
+        self.assertIn('Closed', notification.subject)
+
+    def test_save_without_changes_notifies_nobody(self):
+        self.task.save()
+        self.task.title = 'Renamed'
+        self.task.save()
+        self.assertFalse(EmailNotification.objects.exists())
+
+
+class TaskStatsCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = User.objects.create_user('other', 'other@example.com', 'pass1234')
+
+    def test_counters_follow_create_update_delete_without_queries(self):
+        deadline = timezone.now() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(owner=self.user, title='A', deadline=deadline)
+            Task.objects.create(owner=self.other, title='B', deadline=deadline)
+        self.assertEqual(get_task_stats()['status_counts'], {'new': 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task.status = 'done'
+            task.save()
+            Task.objects.get(title='B').delete()
+
+        with self.assertNumQueries(1):  # only the overdue figure is recomputed
+            stats = get_task_stats()
+        self.assertEqual(stats, {'total_tasks': 1, 'status_counts': {'done': 1}, 'overdue_tasks': 0})
+        self.assertEqual(get_task_stats(owner_id=self.other.pk)['total_tasks'], 0)
+
+    def test_stats_endpoint_owner_scope(self):
+        seed_tasks(self.user, 3)
+        seed_tasks(self.other, 2)
+        self.assertEqual(self.client.get(reverse('task-stats')).data['total_tasks'], 5)
+        self.assertEqual(self.client.get(reverse('task-stats'), {'owner': 'me'}).data['total_tasks'], 3)
+        self.assertEqual(self.client.get(reverse('task-stats'), {'owner': self.user.pk}).data['total_tasks'], 3)
+        self.assertEqual(self.client.get(reverse('task-stats'), {'owner': self.other.pk}).status_code, 403)
+
+        self.user.is_staff = True
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse('task-stats'), {'owner': self.other.pk}).data['total_tasks'], 2)
+
+    def test_change_during_cold_fill_is_not_lost(self):
+        seed_tasks(self.user, 2)
+        counter_entries = stats._counter_entries
+
+        def commit_a_task_mid_fill(prefix, counts):
+            # Lands after the aggregate ran but before the counters are stored
+            with self.captureOnCommitCallbacks(execute=True):
+                Task.objects.create(owner=self.user, title='Late', deadline=timezone.now() + timedelta(days=1))
+            return counter_entries(prefix, counts)
+
+        with mock.patch.object(stats, '_counter_entries', side_effect=commit_a_task_mid_fill):
+            self.assertEqual(get_task_stats()['total_tasks'], 2)
+        self.assertEqual(get_task_stats()['total_tasks'], 3)
+        self.assertEqual(get_task_stats(owner_id=self.user.pk)['total_tasks'], 3)
+
+    def test_stats_computed_in_single_statement(self):
+        seed_tasks(self.user, 3)
+        with self.assertNumQueries(1):
+            stats = get_task_stats()
+        self.assertEqual(stats, {'total_tasks': 3, 'status_counts': {'new': 3}, 'overdue_tasks': 0})
+
+    def test_grouped_stats(self):
+        seed_tasks(self.user, 3)
+        seed_tasks(self.other, 2)
+        response = self.client.get(reverse('task-stats'), {'group_by': 'owner'})
+        self.assertEqual(
+            [(row['owner'], row['total_tasks']) for row in response.data],
+            [('other', 2), ('owner', 3)],
+        )
+        self.assertEqual(self.client.get(reverse('task-stats'), {'group_by': 'day'}).status_code, 400)
+
+    def test_grouped_by_category_skips_deleted_and_uncategorized(self):
+        live, deleted = Category.objects.create(name='Live'), Category.objects.create(name='Deleted')
+        seed_tasks(self.user, 2, categories=[live, deleted])
+        seed_tasks(self.other, 1)
+        deleted.delete()
+        self.assertEqual(
+            [(row['category'], row['total_tasks']) for row in stats.get_grouped_task_stats('category')],
+            [('Live', 2)],
+        )
+
+
+class AuthenticationCacheTests(APITestCase):
+    def test_verified_tokens_expire_after_ttl_or_token_exp(self):
+        token_cache = VerifiedTokenCache(ttl=60)
+        token = AccessToken.for_user(self.user)
+        raw = str(token)
+        token_cache.add(raw, token)
+        self.assertIs(token_cache.get(raw), token)
+        with mock.patch('task_manager.authentication.time.time', return_value=time.time() + 61):
+            self.assertIsNone(token_cache.get(raw))
+
+        token.set_exp(lifetime=timedelta(seconds=5))
+        token_cache.add(raw, token)
+        with mock.patch('task_manager.authentication.time.time', return_value=time.time() + 6):
+            self.assertIsNone(token_cache.get(raw))
+
+    def test_verified_tokens_evict_least_recently_used(self):
+        token_cache = VerifiedTokenCache(maxsize=2)
+        first, second, third = (str(AccessToken.for_user(self.user)) for _ in range(3))
+        token_cache.verify(first)
+        token_cache.verify(second)
+        token_cache.get(first)
+        token_cache.verify(third)
+        self.assertIsNotNone(token_cache.get(first))
+        self.assertIsNone(token_cache.get(second))
+        self.assertIsNotNone(token_cache.get(third))
+
+    def test_user_cache_keeps_auth_fields_only(self):
+        with self.assertNumQueries(1):
+            get_cached_user(self.user.pk)
+        with self.assertNumQueries(0):
+            user = get_cached_user(self.user.pk)
+        self.assertEqual((user.pk, user.username, user.is_active, user.is_staff), (self.user.pk, 'owner', True, False))
+        self.assertEqual(cache.get(user_cache_key(self.user.pk)), (self.user.pk, 'owner', False, True))
+        with self.assertNumQueries(1):  # deferred
+            self.assertEqual(user.email, 'owner@example.com')
+
+    def test_user_cache_dropped_after_commit(self):
+        get_cached_user(self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.is_active = False
+            self.user.save()
+            self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(get_cached_user(self.user.pk).is_active)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertIsNone(get_cached_user(self.user.pk))
+
+    def test_bench_auth_reports_both_paths(self):
+        output = StringIO()
+        call_command('bench_auth', iterations=5, stdout=output)
+        uncached, cached = output.getvalue().splitlines()
+        self.assertTrue(uncached.startswith('uncached') and uncached.endswith('1.00 queries/request'), uncached)
+        self.assertTrue(cached.startswith('cached') and cached.endswith('0.00 queries/request'), cached)
+
+
+class TokenRefreshTests(APITestCase):
+    def test_concurrent_refreshes_mint_one_access_token(self):
+        raw_refresh = str(RefreshToken.for_user(self.user))
+        minted = []
+
+        def mint(raw_token):
+            # Stands in for RefreshToken(): verifying would query the blacklist from the worker threads
+            self.assertEqual(raw_token, raw_refresh)
+            minted.append(AccessToken.for_user(self.user))
+            time.sleep(0.05)
+            return mock.Mock(access_token=minted[-1])
+
+        refresher = SingleFlightRefresher()
+        barrier = threading.Barrier(8)
+        results = []
+
+        def refresh():
+            barrier.wait()
+            results.append(str(refresher.refresh(raw_refresh)))
+
+        with mock.patch('task_manager.authentication.RefreshToken', side_effect=mint):
+            threads = [threading.Thread(target=refresh) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(minted), 1)
+        self.assertEqual(results, [str(minted[0])] * 8)
+
+    def test_invalid_refresh_token_raises(self):
+        with self.assertRaises(TokenError):
+            SingleFlightRefresher().refresh('not-a-token')
+
+        refresh = RefreshToken.for_user(self.user)
+        refresh.blacklist()
+        with self.assertRaises(TokenError):
+            SingleFlightRefresher().refresh(str(refresh))
+
+    def test_prune_tokens_removes_only_expired_rows(self):
+        now = timezone.now()
+        expired, expired_blacklisted, live, live_blacklisted = (
+            OutstandingToken.objects.create(user=self.user, jti=f'jti-{i}', token=f'token-{i}', expires_at=expires_at)
+            for i, expires_at in enumerate([now - timedelta(days=1)] * 2 + [now + timedelta(days=1)] * 2)
+        )
+        BlacklistedToken.objects.create(token=expired_blacklisted)
+        BlacklistedToken.objects.create(token=live_blacklisted)
+
+        output = StringIO()
+        call_command('prune_tokens', dry_run=True, stdout=output)
+        self.assertIn('2 expired outstanding tokens would be deleted', output.getvalue())
+        self.assertEqual(OutstandingToken.objects.count(), 4)
+
+        output = StringIO()
+        call_command('prune_tokens', batch_size=1, stdout=output)
+        self.assertIn('Deleted 2 outstanding and 1 blacklisted tokens', output.getvalue())
+        self.assertEqual(set(OutstandingToken.objects.all()), {live, live_blacklisted})
+        self.assertEqual(list(BlacklistedToken.objects.values_list('token', flat=True)), [live_blacklisted.pk])
+
+
+class SubTaskPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        task = seed_tasks(cls.user, 1)[0]
+        # Equal created_at values exercise the id tie-breaker
+        SubTask.objects.bulk_create(
+            SubTask(owner=cls.user, task=task, title=f'Sub {i}', deadline=task.deadline) for i in range(12)
+        )
+        SubTask.objects.update(created_at=timezone.now())
+
+    def test_page_numbers_stay_default(self):
+        response = self.client.get(reverse('subtask-list-create'))
+        self.assertEqual(response.data['count'], 12)
+
+    def test_cursor_mode_walks_every_row_once(self):
+        for url_name in ('subtask-list-create', 'subtask-list-filter'):
+            with self.subTest(url_name):
+                titles = []
+                url = reverse(url_name) + '?paginate=cursor&page_size=5'
+                while url:
+                    response = self.client.get(url)
+                    self.assertNotIn('count', response.data)
+                    titles += [item['title'] for item in response.data['results']]
+                    url = response.data['next']
+                self.assertEqual(sorted(titles), sorted(f'Sub {i}' for i in range(12)))
+                self.assertEqual(len(titles), 12)
+
+
+class CountingPaginatorTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        seed_tasks(cls.user, 7)
+
+    def test_count_is_cached_per_filter(self):
+        self.assertEqual(CountingPaginator(Task.objects.all(), 5).count, 7)
+        with self.assertNumQueries(0):
+            self.assertEqual(CountingPaginator(Task.objects.order_by('title'), 5).count, 7)
+        with self.assertNumQueries(1):
+            self.assertEqual(CountingPaginator(Task.objects.filter(status='done'), 5).count, 0)
+
+    def test_estimate_above_threshold_is_flagged(self):
+        strategy = CountStrategy(estimate_threshold=1)
+        with mock.patch('task_manager.paginator.estimate_count', return_value=1000):
+            self.assertEqual(strategy.count(Task.objects.all()), (1000, False))
+        self.assertEqual(CountStrategy(estimate_threshold=10_000).count(Task.objects.filter(pk__gt=0)), (7, True))
+
+
+class BulkEndpointTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = User.objects.create_user('other', 'other@example.com', 'pass1234')
+        cls.categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+
+    def setUp(self):
+        super().setUp()
+        self.deadline = (timezone.now() + timedelta(days=3)).isoformat()
+
+    def test_bulk_create_reports_item_errors_and_keeps_the_rest(self):
+        Task.objects.create(owner=self.other, title='Taken', deadline=timezone.now())
+        payload = [
+            {'title': f'Bulk {i}', 'deadline': self.deadline, 'categories': [c.pk for c in self.categories]}
+            for i in range(20)
+        ] + [
+            {'title': 'Taken', 'deadline': self.deadline},
+            {'title': 'Bulk 0', 'deadline': self.deadline},
+            {'title': 'Missing category', 'deadline': self.deadline, 'categories': [999]},
+        ]
+        writer = TaskBulkWriter(self._request(payload), TaskViewSet(action='bulk', format_kwarg=None, kwargs={}))
+        # categories, soft-delete check for the unknown id, uniqueness, savepoint, insert, m2m insert, release
+        with self.assertNumQueries(7):
+            created = writer.create(payload)
+        self.assertEqual(len(created), 20)
+        self.assertEqual(sorted(error['index'] for error in writer.errors), [20, 21, 22])
+
+        response = self.client.post(reverse('task-bulk'), [
+            {'title': 'Another', 'deadline': self.deadline}, {'title': 'Taken', 'deadline': self.deadline},
+        ], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertEqual(Task.objects.get(title='Bulk 3').categories.count(), 3)
+        self.assertEqual(Task.objects.get(title='Bulk 3').owner, self.user)
+
+    def test_bulk_update_and_delete_respect_ownership(self):
+        mine = Task.objects.create(owner=self.user, title='Mine', deadline=timezone.now())
+        theirs = Task.objects.create(owner=self.other, title='Theirs', deadline=timezone.now())
+
+        response = self.client.patch(reverse('task-bulk'), [
+            {'id': mine.pk, 'status': 'done', 'categories': [self.categories[0].pk]},
+            {'id': theirs.pk, 'status': 'done'},
+        ], format='json')
+        self.assertEqual(response.status_code, 207)
+        mine.refresh_from_db()
+        self.assertEqual(mine.status, 'done')
+        self.assertEqual(list(mine.categories.all()), [self.categories[0]])
+        self.assertEqual(Task.objects.get(pk=theirs.pk).status, 'new')
+        self.assertEqual(mine.notifications.count(), 1)
+
+        response = self.client.delete(reverse('task-bulk'), {'ids': [mine.pk, theirs.pk]}, format='json')
+        self.assertEqual(response.data['deleted'], [mine.pk])
+        self.assertTrue(Task.objects.filter(pk=theirs.pk).exists())
+
+    def test_malformed_ids_are_item_errors(self):
+        mine = Task.objects.create(owner=self.user, title='Mine', deadline=timezone.now())
+        response = self.client.patch(reverse('task-bulk'), [
+            {'id': [mine.pk], 'status': 'done'}, {'id': {'pk': mine.pk}}, {'id': 'x'}, {'status': 'done'},
+            {'id': str(mine.pk), 'status': 'done'},
+        ], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 1, 2, 3])
+        self.assertTrue(all('id' in error['errors'] for error in response.data['errors']))
+        self.assertEqual(Task.objects.get(pk=mine.pk).status, 'done')
+
+        response = self.client.delete(reverse('task-bulk'), [{'id': {'pk': mine.pk}}, {'id': [mine.pk]}, 'x'],
+                                      format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 1, 2])
+
+        response = self.client.delete(reverse('task-bulk'), [{'id': mine.pk}], format='json')
+        self.assertEqual(response.data['deleted'], [mine.pk])
+
+    def test_unique_value_taken_after_check_is_an_item_error(self):
+        check_unique = TaskBulkWriter.check_unique
+
+        def take_title_after_check(writer, entries):
+            valid = check_unique(writer, entries)
+            if not Task.objects.filter(title='Raced').exists():
+                Task.objects.create(owner=self.other, title='Raced', deadline=timezone.now())
+            return valid
+
+        payload = [{'title': 'Fine', 'deadline': self.deadline}, {'title': 'Raced', 'deadline': self.deadline}]
+        writer = TaskBulkWriter(self._request(payload), TaskViewSet(action='bulk', format_kwarg=None, kwargs={}))
+        with mock.patch.object(TaskBulkWriter, 'check_unique', take_title_after_check):
+            created = writer.create(payload)
+        self.assertEqual([task.title for task in created], ['Fine'])
+        self.assertEqual(writer.errors, [{'index': 1, 'errors': {'title': ['Task with this title already exists.']}}])
+        self.assertEqual(writer.response({'created': []}, 201).status_code, 400)
+        self.assertEqual(Task.objects.get(title='Raced').owner, self.other)
+
+    def test_categories_only_update_moves_updated_at(self):
+        task = Task.objects.create(owner=self.user, title='Mine', deadline=timezone.now())
+        Task.objects.filter(pk=task.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        response = self.client.patch(reverse('task-bulk'), [
+            {'id': task.pk, 'categories': [self.categories[1].pk]},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        task.refresh_from_db()
+        self.assertGreater(task.updated_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(list(task.categories.all()), [self.categories[1]])
+
+    def test_bulk_subtasks(self):
+        task = Task.objects.create(owner=self.user, title='Parent', deadline=timezone.now())
+        response = self.client.post(reverse('subtask-bulk'), [
+            {'title': f'Sub {i}', 'task': task.pk, 'deadline': self.deadline} for i in range(5)
+        ] + [{'title': 'Orphan', 'task': 999, 'deadline': self.deadline}], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(task.subtasks.count(), 5)
+
+    def _request(self, data):
+        request = APIRequestFactory().post('/', data, format='json')
+        request.user = self.user
+        return request
+
+
+class ExportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = User.objects.create_user('other', 'other@example.com', 'pass1234')
+        cls.categories = [Category.objects.create(name=f'Category {i}') for i in range(2)]
+        cls.tasks = seed_tasks(cls.user, 2, categories=cls.categories, subtasks_per_task=1)
+        seed_tasks(cls.other, 1)
+
+    def export(self, url_name='task-export', **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_export(self):
+        rows = [json.loads(line) for line in self.export(output='ndjson').decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], sorted(Task.objects.values_list('id', flat=True)))
+        self.assertEqual(rows[0]['owner'], 'owner')
+        self.assertEqual(sorted(rows[0]['categories']), [category.pk for category in self.categories])
+
+    def test_csv_export(self):
+        header, *rows = csv.reader(self.export(output='csv').decode().splitlines())
+        self.assertEqual(header, list(TASK_FIELDS))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(sorted(rows[0][header.index('categories')].split(';')),
+                         [str(category.pk) for category in self.categories])
+
+        header, *rows = csv.reader(self.export('subtask-export', output='csv').decode().splitlines())
+        self.assertEqual((header, len(rows)), (list(SUBTASK_FIELDS), 2))
+
+    def test_empty_csv_export_still_has_header(self):
+        self.assertEqual(self.export(output='csv', status='done').decode(), ','.join(TASK_FIELDS) + '\r\n')
+
+    def test_gzip_export(self):
+        response = self.client.get(reverse('task-export'), {'output': 'csv', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('tasks.csv.gz', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.export(output='csv'))
+
+    def test_owner_scoping(self):
+        self.assertEqual(len(self.export(owner='me').splitlines()), 2)
+        self.assertEqual(self.client.get(reverse('task-export'), {'owner': self.other.pk}).status_code, 403)
+        self.user.is_staff = True
+        self.client.force_authenticate(self.user)
+        self.assertEqual(len(self.export(owner=self.other.pk).splitlines()), 1)
+
+    def test_export_queries_do_not_grow_with_rows(self):
+        # Streaming responses run after QueryBudgetMiddleware, so the count is checked here
+        def count(url_name):
+            with CaptureQueriesContext(connection) as ctx:
+                self.export(url_name)
+            return len(ctx.captured_queries)
+
+        before = {url_name: count(url_name) for url_name in ('task-export', 'subtask-export')}
+        more = User.objects.create_user('more', 'more@example.com', 'pass1234')
+        seed_tasks(more, 20, categories=self.categories, subtasks_per_task=2)
+        self.assertEqual({url_name: count(url_name) for url_name in before}, before)
+
+    def test_export_tasks_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tasks.csv.gz')
+            call_command('export_tasks', fmt='csv', owner=self.user.pk, gzip=True, output=path)
+            with gzip.open(path, 'rt', newline='') as output:
+                header, *rows = csv.reader(output)
+        self.assertEqual(header, list(TASK_FIELDS))
+        self.assertEqual(sorted(int(row[0]) for row in rows), sorted(task.pk for task in self.tasks))
+
+
+class FullTextSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        deadline = timezone.now() + timedelta(days=1)
+        cls.report = Task.objects.create(owner=cls.user, title='Quarterly report', description='numbers', deadline=deadline)
+        cls.deploy = Task.objects.create(owner=cls.user, title='Deploy', description='report the release', deadline=deadline)
+        Task.objects.create(owner=cls.user, title='Unrelated', deadline=deadline)
+        SubTask.objects.create(owner=cls.user, task=cls.report, title='Collect data', deadline=deadline)
+
+    def test_prefix_search_uses_index_and_tracks_updates(self):
+        response = self.client.get(reverse('task-list'), {'search': 'repo'})
+        self.assertEqual({item['title'] for item in response.data['results']}, {'Quarterly report', 'Deploy'})
+
+        self.deploy.description = 'ship it'
+        self.deploy.save()
+        self.report.delete()
+        response = self.client.get(reverse('task-list'), {'search': 'repo'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_results_are_ranked_without_explicit_ordering(self):
+        SubTask.objects.create(owner=self.user, task=self.deploy, title='Report report', description='report',
+                               deadline=timezone.now())
+        SubTask.objects.create(owner=self.user, task=self.deploy, title='Weekly', description='a report',
+                               deadline=timezone.now())
+        response = self.client.get(reverse('subtask-list-create'), {'search': 'report'})
+        self.assertEqual([item['title'] for item in response.data['results']], ['Report report', 'Weekly'])
+
+    def test_subtask_filter_by_task_title(self):
+        response = self.client.get(reverse('subtask-list-filter'), {'task_title': 'quarter'})
+        self.assertEqual([item['title'] for item in response.data['results']], ['Collect data'])
+
+
+class ConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tasks = seed_tasks(cls.user, 3, subtasks_per_task=2)
+
+    def assertRevalidates(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+        # Only the validators query, or nothing at all when the list comes from the response cache
+        self.assertLessEqual(len(ctx.captured_queries), 1)
+
+        change()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_task_list_changes_on_update_and_delete(self):
+        url = reverse('task-list')
+        task = Task.objects.get(pk=self.tasks[0].pk)
+        task.status = 'done'
+        self.assertRevalidates(url, task.save)
+        self.assertRevalidates(url, Task.objects.get(pk=self.tasks[1].pk).delete)
+
+    def test_task_list_and_detail_change_on_category_links(self):
+        category = Category.objects.create(name='Home')
+        task = self.tasks[0]
+        self.assertRevalidates(reverse('task-list'), lambda: task.categories.add(category))
+        self.assertRevalidates(reverse('task-detail', args=[task.pk]), lambda: task.categories.remove(category))
+        self.assertRevalidates(reverse('task-list-by-day'), lambda: task.categories.add(category))
+        self.assertRevalidates(reverse('task-list'), lambda: Category.objects.filter(pk=category.pk).first().delete())
+
+    def test_task_detail_tracks_its_subtasks(self):
+        task = self.tasks[0]
+        url = reverse('task-detail', args=[task.pk])
+        subtask = task.subtasks.first()
+        subtask.status = 'done'
+        self.assertRevalidates(url, subtask.save)
+        self.assertRevalidates(url, lambda: task.subtasks.first().delete())
+
+    def test_subtask_and_category_resources(self):
+        subtask = SubTask.objects.first()
+        subtask.title = 'Renamed'
+        self.assertRevalidates(reverse('subtask-detail-update', args=[subtask.pk]), subtask.save)
+        self.assertRevalidates(reverse('subtask-list-filter'), lambda: SubTask.objects.last().delete())
+
+        category = Category.objects.create(name='Home')
+        self.assertRevalidates(reverse('category-list'), category.delete)
+
+    def test_if_modified_since_on_single_row(self):
+        subtask = SubTask.objects.first()
+        url = reverse('subtask-detail-update', args=[subtask.pk])
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+
+class ResponseCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = User.objects.create_user('other', 'other@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Work')
+        cls.tasks = seed_tasks(cls.user, 3, subtasks_per_task=1)
+
+    def setUp(self):
+        super().setUp()
+        response_cache_stats.reset()
+
+    def get(self, url, **params):
+        return self.client.get(url, params)
+
+    def test_hit_skips_database(self):
+        url = reverse('task-list')
+        self.assertEqual(self.get(url, status='new', page_size=5)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.get(url, page_size=5, status='new')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response_cache_stats.snapshot()['TaskViewSet.list'], {'hits': 1, 'misses': 1})
+
+    def test_entries_are_per_user(self):
+        url = reverse('subtask-list-create')
+        self.get(url)
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.get(url)['X-Cache'], 'MISS')
+
+    def test_writes_invalidate_dependent_lists(self):
+        task_url, category_url = reverse('task-list'), reverse('category-list')
+        self.get(task_url)
+        self.get(category_url)
+
+        self.tasks[0].categories.add(self.category)
+        response = self.get(task_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn(self.category.pk, [category for item in response.data['results'] for category in item['categories']])
+
+        self.category.delete()
+        self.assertEqual(self.get(category_url)['X-Cache'], 'MISS')
+        self.assertEqual(self.get(task_url)['X-Cache'], 'MISS')
+
+    def test_bulk_writes_invalidate(self):
+        url = reverse('subtask-list-create')
+        self.get(url)
+        response = self.client.patch(reverse('subtask-bulk'), [{'id': SubTask.objects.first().pk, 'status': 'done'}],
+                                     format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('done', [item['status'] for item in response.data['results']])
+
+
+class AsgiRequestTests(APITestCase):
+    """The sync views under the ASGI handler, behind the async JWT middleware."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tasks = seed_tasks(cls.user, 7, subtasks_per_task=2)
+
+    def setUp(self):
+        super().setUp()
+        self.client = AsyncClient()
+        self.headers = {'authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def get(self, url, params=None):
+        return await self.client.get(url, params, headers=self.headers)
+
+    async def test_requires_authentication(self):
+        response = await AsyncClient().get(reverse('task-list'))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_cookie_authentication_through_async_middleware(self):
+        client = AsyncClient()
+        client.cookies['access_token'] = str(AccessToken.for_user(self.user))
+        response = await client.get(reverse('task-stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_tasks'], 7)
+
+    async def test_task_detail(self):
+        response = await self.get(reverse('task-detail', args=[self.tasks[0].pk]))
+        self.assertEqual(len(response.json()['subtasks']), 2)
+        self.assertEqual((await self.get(reverse('task-detail', args=[0]))).status_code, 404)
+
+
+class BulkRelatedFieldTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.categories = [Category.objects.create(name=f'Category {i}') for i in range(30)]
+
+    def setUp(self):
+        super().setUp()
+        self.deadline = (timezone.now() + timedelta(days=3)).isoformat()
+
+    def test_categories_resolve_in_one_query(self):
+        payload = {'title': 'Many categories', 'deadline': self.deadline,
+                   'categories': [category.pk for category in self.categories]}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('task-list'), payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        category_selects = [query for query in ctx.captured_queries
+                            if query['sql'].startswith('SELECT') and 'FROM "task_manager_category"' in query['sql']]
+        # One to resolve the ids, one to render the response
+        self.assertEqual(len(category_selects), 2)
+        self.assertEqual(Task.objects.get(title='Many categories').categories.count(), 30)
+
+    def test_missing_and_deleted_ids_are_reported_together(self):
+        self.categories[0].delete()
+        payload = {'title': 'Broken', 'deadline': self.deadline,
+                   'categories': [self.categories[0].pk, self.categories[1].pk, 998, 999]}
+        response = self.client.post(reverse('task-list'), payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['categories'], [
+            'Invalid pk(s) [998, 999] - object does not exist.',
+            f'Deleted pk(s) [{self.categories[0].pk}] - object is no longer available.',
+        ])
+
+
+class UniqueConstraintTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.task = Task.objects.create(owner=cls.user, title='Taken', deadline=timezone.now() + timedelta(days=3))
+
+    def setUp(self):
+        super().setUp()
+        self.deadline = (timezone.now() + timedelta(days=3)).isoformat()
+
+    def assertNoUniquenessCheck(self, ctx, table):
+        prechecks = [query for query in ctx.captured_queries
+                     if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']
+                     and 'LIMIT 1' in query['sql']]
+        self.assertEqual(prechecks, [])
+
+    def test_duplicate_category_name(self):
+        Category.objects.create(name='Work')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('category-list'), {'name': 'Work'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['name'], ['Category with this name already exists.'])
+        self.assertNoUniquenessCheck(ctx, 'task_manager_category')
+
+    def test_name_of_soft_deleted_category_is_still_taken(self):
+        Category.objects.create(name='Archived').delete()
+        response = self.client.post(reverse('category-list'), {'name': 'Archived'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.data)
+
+    def test_duplicate_task_and_subtask_titles(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('task-list'), {'title': 'Taken', 'deadline': self.deadline},
+                                        format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('title', response.data)
+        self.assertNoUniquenessCheck(ctx, 'task_manager_task')
+
+        SubTask.objects.create(owner=self.user, task=self.task, title='Step', deadline=timezone.now())
+        response = self.client.post(reverse('subtask-list-create'),
+                                    {'title': 'Step', 'task': self.task.pk, 'deadline': self.deadline},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('title', response.data)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_update_to_taken_title(self):
+        other = Task.objects.create(owner=self.user, title='Other', deadline=timezone.now() + timedelta(days=3))
+        response = self.client.patch(reverse('task-detail', args=[other.pk]), {'title': 'Taken'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('title', response.data)
+        other.refresh_from_db()
+        self.assertEqual(other.title, 'Other')
+
+    def test_register_duplicate_username(self):
+        client = APIClient()
+        response = client.post(reverse('register'), {'username': 'owner', 'email': 'new@example.com',
+                                                      'password': 'pass1234', 'password2': 'pass1234'},
+                               format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', response.data)
+
+
+class LoggingPipelineTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'db.log'
+        self.handler = QueueFileHandler(self.path, max_bytes=2000, backup_count=2)
+        self.handler.setFormatter(JSONFormatter())
+        self.handler.addFilter(SlowQueryFilter(slow_ms=50))
+        self.addCleanup(self.handler.close)
+        self.logger = logging.getLogger('task_manager.tests.logging')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def log_query(self, sql, duration):
+        self.logger.debug('(%.3f) %s; args=%s; alias=%s', duration, sql, (), 'default',
+                          extra={'duration': duration, 'sql': sql, 'params': (), 'alias': 'default'})
+
+    def test_only_slow_queries_are_written_as_json(self):
+        self.log_query('SELECT 1', 0.002)
+        self.log_query('SELECT 2', 0.2)
+        self.logger.info('migrated')
+        self.handler.flush()
+        entries = [json.loads(line) for line in self.path.read_text().splitlines()]
+        self.assertEqual([entry['message'] for entry in entries], ['SELECT 2', 'migrated'])
+        self.assertEqual(entries[0]['duration_ms'], 200.0)
+        self.assertEqual(entries[0]['alias'], 'default')
+        self.assertNotIn('params', entries[0])
+
+    def test_rotates_by_size(self):
+        for i in range(50):
+            self.log_query(f'SELECT {i}', 1)
+        self.handler.flush()
+        self.assertTrue(self.path.with_name('db.log.1').exists())
+        self.assertLessEqual(self.path.stat().st_size, 2000)
+
+    def test_request_is_reduced_to_method_and_path(self):
+        request = APIRequestFactory().get('/task_manager/tasks/')
+        self.logger.warning('Not Found: %s', request.path, extra={'status_code': 404, 'request': request})
+        self.handler.flush()
+        entry = json.loads(self.path.read_text())
+        self.assertEqual((entry['method'], entry['path'], entry['status_code']), ('GET', '/task_manager/tasks/', 404))
+
+    def test_message_and_traceback_are_rendered_when_logged(self):
+        items = ['first']
+        try:
+            raise ValueError('broken')
+        except ValueError:
+            self.logger.exception('items: %s', items)
+        prepared = self.handler.prepare(logging.makeLogRecord({'msg': 'items: %s', 'args': (items,)}))
+        items.append('second')
+        self.assertEqual((prepared.getMessage(), prepared.args), ("items: ['first']", None))
+        self.handler.flush()
+        entry = json.loads(self.path.read_text())
+        self.assertEqual(entry['message'], "items: ['first']")
+        self.assertIn('ValueError: broken', entry['exc_info'])
+
+
+class PerformanceMetricsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        seed_tasks(cls.user, 3)
+
+    def setUp(self):
+        super().setUp()
+        metrics.route_metrics.reset()
+        self.addCleanup(metrics.route_metrics.reset)
+
+    def server_timing(self, response):
+        entries = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            entries[name] = dict(param.split('=', 1) for param in params)
+        return entries
+
+    def test_server_timing_reports_phases_and_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('task-list'))
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'auth', 'connect', 'db', 'view', 'serialize', 'render', 'total'})
+        self.assertEqual(timing['db']['desc'], f'"{len(ctx.captured_queries)} queries"')
+        self.assertGreater(float(timing['serialize']['dur']) + float(timing['render']['dur']), 0)
+
+    def test_metrics_endpoint_exposes_route_histograms(self):
+        self.client.get(reverse('task-list'))
+        self.client.get(reverse('task-list'))
+        self.client.get(reverse('category-list'))
+        with mock.patch.object(metrics, 'ALLOWED_IPS', {'127.0.0.1'}):
+            text = self.client.get('/metrics').content.decode()
+        self.assertIn('task_manager_http_requests_total{route="task-list",method="GET",status="200"} 2', text)
+        self.assertIn('task_manager_http_request_duration_seconds_count{route="task-list",phase="db"} 2', text)
+        self.assertIn('task_manager_http_request_queries_bucket{route="category-list",le="+Inf"} 1', text)
+        self.assertIn('task_manager_response_cache_requests_total{view="TaskViewSet.list",result="hits"}', text)
+
+    def test_unsampled_requests_are_only_counted(self):
+        with mock.patch.object(metrics, 'SAMPLE_RATE', 0):
+            response = self.client.get(reverse('task-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics.route_metrics.requests[('task-list', 'GET', 200)], 1)
+        self.assertNotIn(('task-list', 'total'), metrics.route_metrics.durations)
+
+    def test_metrics_token(self):
+        with mock.patch.object(metrics, 'TOKEN', 'secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_metrics_without_token_only_for_allowed_ips(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='8.8.8.8').status_code, 403)
+        with mock.patch.object(metrics, 'ALLOWED_IPS', {'10.0.0.5'}):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    def test_debug_env_string_is_parsed(self):
+        settings_file = Path(settings.BASE_DIR) / 'DjangoProject_ICH' / 'settings.py'
+        for value, expected in (('False', False), ('0', False), ('True', True)):
+            with mock.patch.dict(os.environ, {'DEBUG': value}):
+                self.assertIs(runpy.run_path(str(settings_file))['DEBUG'], expected)
+
+
+class SeedAndBenchCommandTests(APITestCase):
+    def test_seed_generates_linked_rows_and_keeps_search_in_sync(self):
+        seeding.seed_tasks(200, subtasks_per_task=2, users=5, categories=4, categories_per_task=2, chunk_size=64,
+                           prefix='t')
+        self.assertEqual(Task.objects.count(), 200)
+        self.assertEqual(SubTask.objects.count(), 400)
+        self.assertEqual(User.objects.filter(username__startswith='t_user_').count(), 5)
+        self.assertEqual(Category.objects.count(), 4)
+        self.assertTrue(Task.categories.through.objects.exists())
+        self.assertGreater(len(set(Task.objects.values_list('status', flat=True))), 3)
+        self.assertFalse(SubTask.objects.filter(task__status='done').exclude(status='done').exists())
+        task = Task.objects.order_by('?').first()
+        self.assertEqual(task.deadline_weekday, (timezone.localtime(task.deadline).isoweekday() % 7) + 1)
+
+        self.assertIn(task, full_text_search(Task.objects.all(), ['title'], [task.title]))
+        self.client.force_authenticate(task.owner)
+        # The sync triggers are back after the load
+        self.client.post(reverse('task-list'), {'title': 'Fresh zebra', 'deadline': timezone.now().isoformat()},
+                         format='json')
+        response = self.client.get(reverse('task-list'), {'search': 'zebra'})
+        self.assertEqual([item['title'] for item in response.data['results']], ['Fresh zebra'])
+
+    def test_bench_api_reports_each_route(self):
+        seeding.seed_tasks(10, subtasks_per_task=1, users=1, categories=2, prefix='b')
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command('bench_api', requests=3, warmup=0, routes=['task-list', 'task-detail', 'login'],
+                         writes=True, output=output.name, stderr=mock.MagicMock())
+            report = json.load(open(output.name))
+        routes = {(row['route'], row['method']): row for row in report['routes']}
+        self.assertEqual(set(routes), {('task-list', 'GET'), ('task-list', 'POST'), ('task-detail', 'GET')})
+        self.assertEqual(routes[('task-list', 'POST')]['statuses'], {'201': 3})
+        self.assertEqual(routes[('task-detail', 'GET')]['statuses'], {'200': 3})
+        self.assertGreater(routes[('task-detail', 'GET')]['queries_per_request'], 0)
+        self.assertEqual(report['skipped'], [{'route': 'login', 'reason': 'write-only (POST)'}])
+        self.assertEqual(Task.objects.count(), 10)
+
+
+class QueryIndexTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        seed_tasks(cls.user, 20, subtasks_per_task=1)
+
+    def test_list_queries_use_composite_indexes(self):
+        self.assertIn('task_owner_created_idx', Task.objects.filter(owner=self.user).order_by('-created_at')[:5].explain())
+        task_id = SubTask.objects.values_list('task_id', flat=True).first()
+        self.assertIn('subtask_task_created_idx', SubTask.objects.filter(task_id=task_id).order_by('-created_at')[:5].explain())
+
+    @skipUnless(connection.features.supports_partial_indexes, 'needs partial indexes')
+    def test_overdue_count_uses_partial_index(self):
+        plan = Task.objects.filter(StatsQuery.overdue_filter()).order_by().explain()
+        self.assertIn('task_open_deadline_idx', plan)
+
+    def test_benchmark_indexes_asks_before_dropping_indexes(self):
+        with mock.patch('builtins.input', return_value='no') as prompt:
+            with self.assertRaisesMessage(CommandError, 'Benchmark cancelled.'):
+                call_command('benchmark_indexes', stdout=StringIO())
+        self.assertIn('"default" database', prompt.call_args.args[0])
+
+        output = StringIO()
+        with mock.patch('builtins.input') as prompt, self.assertNumQueries(16):
+            # 2 counts + 2 first-row lookups + 6 queries x (1 timed run + EXPLAIN)
+            call_command('benchmark_indexes', skip_before=True, repeat=1, database='default', stdout=output)
+        prompt.assert_not_called()
+        self.assertIn('overdue count', output.getvalue())
+
+
+class QueryBudgetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.categories = [Category.objects.create(name=f'Category {i}') for i in range(2)]
+
+    def test_list_budget_holds_for_any_page_size(self):
+        seed_tasks(self.user, 120, categories=self.categories, subtasks_per_task=1)
+        for page_size in (5, 100):
+            with self.subTest(page_size=page_size), query_budget.track_queries('subtasks') as log:
+                response = self.client.get(reverse('subtask-list-create'), {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+            self.assertLessEqual(len(log.queries), SubTaskListCreateView.query_budgets['get'])
+
+    def test_streaming_responses_are_exempt(self):
+        with mock.patch.dict(TaskViewSet.query_budgets, {'export_tasks': 0}):
+            response = self.client.get(reverse('task-export'))
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+
+    def test_exceeded_budget_fails_with_grouped_sql(self):
+        seed_tasks(self.user, 3, categories=self.categories)
+        with mock.patch.dict(TaskViewSet.query_budgets, {'list': 1}):
+            with self.assertRaises(query_budget.QueryBudgetExceeded) as raised:
+                self.client.get(reverse('task-list'))
+        report = str(raised.exception)
+        query_budget.violations.remove(report)
+        self.assertTrue(report.startswith('GET task-list: 3 queries, budget 1\n'))
+        self.assertIn('FROM "task_manager_task"', report)
+
+    def test_normalize_sql_groups_repeated_statements(self):
+        log = query_budget.QueryLog('n+1', 2)
+        log.queries = [f'SELECT * FROM "auth_user" WHERE "auth_user"."id" = {pk} LIMIT 21' for pk in (1, 2, 3)]
+        log.queries.append("SELECT * FROM \"task_manager_task\" WHERE \"id\" IN (%s, %s) AND \"title\" = 'a'")
+        self.assertEqual(log.grouped(), [
+            (3, 'SELECT * FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?'),
+            (1, 'SELECT * FROM "task_manager_task" WHERE "id" IN (...) AND "title" = ?'),
+        ])
+        self.assertTrue(log.exceeded)
+
+    @override_settings(QUERY_BUDGET_MODE='log')
+    def test_log_mode_reports_real_traffic(self):
+        with mock.patch.dict(TaskViewSet.query_budgets, {'list': 0}), \
+                self.assertLogs('task_manager.query_budget', 'WARNING') as logs:
+            response = self.client.get(reverse('task-list'))
+        query_budget.violations.clear()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('GET task-list', logs.output[0])
+
+    def test_signal_handler_budget(self):
+        task = Task.objects.get(pk=seed_tasks(self.user, 1)[0].pk)
+        self.assertEqual(signals.send_status_change_notification.query_budget, 2)
+        task.status = 'done'
+        task.save()  # within budget: the owner's email and the outbox insert
+        self.assertEqual(task.notifications.count(), 1)
+
+        @query_budget.query_budget(0)
+        def handler():
+            return User.objects.count()
+
+        with self.assertRaises(query_budget.QueryBudgetExceeded) as raised:
+            handler()
+        query_budget.violations.remove(str(raised.exception))
+
+
+class ReplicaRouterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.task = seed_tasks(cls.user, 1)[0]
+
+    def setUp(self):
+        super().setUp()
+        db_router._health.clear()
+
+    # The test mirror of a replica can't see uncommitted rows, so the primary plays the replica
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_list_reads_use_a_replica_until_the_client_writes(self):
+        with mock.patch.object(db_router, 'choose_replica', return_value='default') as choose:
+            self.client.get(reverse('task-list'))
+            self.assertEqual(choose.call_count, 1)
+            self.client.get(reverse('task-detail', args=[self.task.pk]))
+            self.assertEqual(choose.call_count, 1)
+
+            response = self.client.post(reverse('category-list'), {'name': 'Sticky'}, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertIn(db_router.STICKY_COOKIE, response.cookies)
+            # Read-your-writes: the cookie keeps this client on the primary for a while
+            self.client.get(reverse('category-list'))
+            self.assertEqual(choose.call_count, 1)
+
+    def test_views_opt_in_per_action(self):
+        self.assertTrue(db_router.reads_from_replica(resolve(reverse('task-list')).func, 'GET'))
+        self.assertTrue(db_router.reads_from_replica(resolve(reverse('task-stats')).func, 'GET'))
+        self.assertTrue(db_router.reads_from_replica(resolve(reverse('task-list-by-day')).func, 'GET'))
+        self.assertFalse(db_router.reads_from_replica(resolve(reverse('task-list')).func, 'POST'))
+        self.assertFalse(db_router.reads_from_replica(resolve(reverse('task-detail', args=[1])).func, 'GET'))
+
+    def test_lagging_or_missing_replica_falls_back_to_the_primary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            primary, replica = Path(directory, 'primary.sqlite3'), Path(directory, 'replica.sqlite3')
+            for path in (primary, replica):
+                sqlite3.connect(path).close()
+            stat = primary.stat()
+            os.utime(replica, (stat.st_atime - 30, stat.st_mtime - 30))
+            self.assertAlmostEqual(db_router.sqlite_lag(primary, replica), 30, places=3)
+            with self.assertRaises(DatabaseError):
+                db_router.sqlite_lag(primary, Path(directory, 'missing.sqlite3'))
+
+        with mock.patch.object(db_router, 'get_replicas', return_value=['replica']), \
+                mock.patch.object(db_router, 'replica_lag', return_value=30) as lag, \
+                self.assertLogs('task_manager.db_router', 'WARNING'):
+            self.assertIsNone(db_router.choose_replica())
+            self.assertIsNone(db_router.choose_replica())
+            # Checked once per REPLICA_CHECK_INTERVAL
+            self.assertEqual(lag.call_count, 1)
+
+            db_router._health.clear()
+            lag.side_effect = DatabaseError('unreachable')
+            self.assertIsNone(db_router.choose_replica())
+
+            db_router._health.clear()
+            lag.side_effect, lag.return_value = None, 0.5
+            self.assertEqual(db_router.choose_replica(), 'replica')
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+
+    def ping(self):
+        if not self.healthy:
+            raise OSError('server has gone away')
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_connections_are_reused(self):
+        pool = ConnectionPool(max_size=2)
+        first, reused = pool.acquire(FakeConnection)
+        self.assertFalse(reused)
+        pool.release(first)
+        self.assertEqual(pool.acquire(FakeConnection), (first, True))
+        self.assertEqual((pool.size, pool.idle), (1, 0))
+
+    def test_waits_for_a_free_connection_then_times_out(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        connection, _ = pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+
+        timer = threading.Timer(0.02, pool.release, [connection])
+        timer.start()
+        pool.timeout = 5
+        started = time.monotonic()
+        self.assertEqual(pool.acquire(FakeConnection), (connection, True))
+        self.assertLess(time.monotonic() - started, 1)
+        timer.join()
+
+    def test_broken_and_old_connections_are_recycled(self):
+        pool = ConnectionPool(max_size=1, check_idle=0)
+        connection, _ = pool.acquire(FakeConnection)
+        pool.release(connection, discard=True)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.size, 0)
+
+        connection, _ = pool.acquire(FakeConnection)
+        connection.healthy = False
+        pool.release(connection)
+        replacement, reused = pool.acquire(FakeConnection)
+        self.assertFalse(reused)
+        self.assertTrue(connection.closed)
+
+        pool.release(replacement)
+        pool.max_lifetime = 0
+        self.assertIsNot(pool.acquire(FakeConnection)[0], replacement)
+        self.assertTrue(replacement.closed)
+        self.assertEqual(pool.size, 1)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0)
+
+        def refuse():
+            raise OSError('connection refused')
+
+        with self.assertRaises(OSError):
+            pool.acquire(refuse)
+        self.assertIsInstance(pool.acquire(FakeConnection)[0], FakeConnection)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """An SMTP server that accepts the connection and rejects every message."""
+
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPRecipientsRefused({})
+
+
+class NotificationOutboxTests(APITestCase):
+    def enqueue(self, count=1):
+        tasks = [Task.objects.get(pk=task.pk) for task in seed_tasks(self.user, count)]
+        for task in tasks:
+            task.status = 'done'
+            task.save()
+        return list(EmailNotification.objects.order_by('id'))
+
+    def test_sends_due_notifications(self):
+        self.enqueue(2)
+        self.assertEqual(notifications.deliver_pending(), (2, 0))
+        self.assertEqual([message.to for message in mail.outbox], [['owner@example.com']] * 2)
+        self.assertEqual(set(EmailNotification.objects.values_list('status', 'attempts')), {('sent', 1)})
+        self.assertEqual(notifications.deliver_pending(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='task_manager.tests.FailingEmailBackend')
+    def test_failures_back_off_then_give_up(self):
+        notification, = self.enqueue()
+        with mock.patch.object(notifications, 'MAX_ATTEMPTS', 2):
+            self.assertEqual(notifications.deliver_pending(max_attempts=2), (0, 1))
+            notification.refresh_from_db()
+            self.assertEqual((notification.status, notification.attempts), ('pending', 1))
+            self.assertIn('SMTPRecipientsRefused', notification.last_error)
+            self.assertGreater(notification.next_attempt_at, timezone.now() + timedelta(seconds=50))
+            # Not due yet
+            self.assertEqual(notifications.deliver_pending(max_attempts=2), (0, 0))
+
+            EmailNotification.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(notifications.deliver_pending(max_attempts=2), (0, 1))
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('failed', 2))
+
+    def test_crash_mid_batch_resends_only_unsent(self):
+        first, second = self.enqueue(2)
+        send = mail.get_connection().__class__.send_messages
+        calls = []
+
+        def crash_on_second(backend, messages):
+            calls.append(messages)
+            if len(calls) == 2:
+                raise SystemExit('worker killed')
+            return send(backend, messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', crash_on_second):
+            with self.assertRaises(SystemExit):
+                notifications.deliver_pending()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, 'sent')
+        self.assertEqual(second.status, 'sending')
+        # Leased: not claimed again until SEND_TIMEOUT has passed
+        self.assertEqual(notifications.deliver_pending(), (0, 0))
+
+        EmailNotification.objects.filter(pk=second.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(notifications.deliver_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.attempts), ('sent', 2))
+
+    def test_send_notifications_command(self):
+        self.enqueue(3)
+        output = StringIO()
+        call_command('send_notifications', batch_size=2, stdout=output)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('Done: 3 sent, 0 failed', output.getvalue())
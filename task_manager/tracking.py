@@ -0,0 +1,86 @@
+from django.db import models
+
+
+class FieldTrackerMixin(models.Model):
+    """
+    Remembers the column values an instance was loaded (or last saved) with,
+    so change detection needs no extra query.
+
+    Saving a tracked instance without explicit ``update_fields`` writes only
+    the changed columns (plus ``auto_now`` fields).
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._original_values = {}
+        instance._snapshot()
+        return instance
+
+    def _snapshot(self, attnames=None):
+        if attnames is None:
+            attnames = [field.attname for field in self._meta.concrete_fields]
+        original = getattr(self, '_original_values', None)
+        if original is None:
+            original = self._original_values = {}
+        for attname in attnames:
+            # Deferred fields are not in __dict__ and stay untracked
+            if attname in self.__dict__:
+                original[attname] = self.__dict__[attname]
+
+    def _attname(self, field_name):
+        return self._meta.get_field(field_name).attname
+
+    @property
+    def is_tracked(self):
+        return getattr(self, '_original_values', None) is not None
+
+    def get_original(self, field_name):
+        return self._original_values.get(self._attname(field_name)) if self.is_tracked else None
+
+    def has_changed(self, field_name):
+        if not self.is_tracked:
+            return False
+        attname = self._attname(field_name)
+        if attname not in self.__dict__:
+            return False
+        if attname not in self._original_values:
+            # A deferred field that was assigned: its old value is unknown
+            return True
+        return self._original_values[attname] != self.__dict__[attname]
+
+    @property
+    def changed_fields(self):
+        """Names of concrete fields whose value differs from the loaded one."""
+        if not self.is_tracked:
+            return []
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and self.has_changed(field.name)
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if (update_fields is None and not kwargs.get('force_insert') and
+                not self._state.adding and self.is_tracked):
+            changed = self.changed_fields
+            if changed:
+                auto_now = [
+                    field.name for field in self._meta.concrete_fields
+                    if getattr(field, 'auto_now', False)
+                ]
+                kwargs['update_fields'] = list(dict.fromkeys(changed + auto_now))
+        # Snapshot only after super().save(), so post_save receivers
+        # still see the old values through has_changed().
+        super().save(*args, **kwargs)
+        if kwargs.get('update_fields') is None:
+            self._snapshot()
+        else:
+            self._snapshot([self._attname(name) for name in kwargs['update_fields']])
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._snapshot(None if fields is None else [self._attname(name) for name in fields])
@@ -1,7 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import TaskViewSet, SubTaskListCreateView, SubTaskDetailUpdateDeleteView, TaskListByDay, \
-    FilteredSubTaskListView, CategoryViewSet, RegisterView, LoginView, LogoutView
+    FilteredSubTaskListView, CategoryViewSet, RegisterView, LoginView, LogoutView, SubTaskBulkView, \
+    SubTaskExportView, ResponseCacheStatsView
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -14,8 +15,11 @@ router.register(r'categories', CategoryViewSet, basename='category')
 urlpatterns = [
     path('', include(router.urls)),
     path('subtasks/', SubTaskListCreateView.as_view(), name='subtask-list-create'),
+    path('subtasks/export/', SubTaskExportView.as_view(), name='subtask-export'),
+    path('subtasks/bulk/', SubTaskBulkView.as_view(), name='subtask-bulk'),
     path('subtasks/<int:pk>/', SubTaskDetailUpdateDeleteView.as_view(), name='subtask-detail-update'),
     path('subtasks/filter/', FilteredSubTaskListView.as_view(), name='subtask-list-filter'),
+    path('cache/stats/', ResponseCacheStatsView.as_view(), name='response-cache-stats'),
     path('tasks-by-day/', TaskListByDay.as_view(), name='task-list-by-day'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
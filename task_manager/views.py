@@ -2,11 +2,12 @@ from datetime import datetime, timezone
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status, filters, permissions
+from rest_framework import status, permissions
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.generics import get_object_or_404, ListCreateAPIView, RetrieveUpdateDestroyAPIView, CreateAPIView
+from rest_framework.generics import get_object_or_404, GenericAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView, \
+    CreateAPIView
 from rest_framework.decorators import action
-from django.db.models.functions import ExtractWeekDay
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
@@ -15,149 +16,303 @@ from .permissions import IsOwnerOrReadOnly
 from .models import Task, SubTask, Category
 from .serializers import SubTaskCreateSerializer, CategoryCreateSerializer, TaskModelSerializer, TaskDetailSerializer, \
                          RegisterSerializer
-from .paginator import SubTaskPagination, DefaultCursorPagination
-
-from django.utils.timezone import now
-from django.db.models import Count, Q
-
-
-class TaskViewSet(ModelViewSet):
+from .paginator import SubTaskPagination, SubTaskCursorPagination, DefaultCursorPagination
+from .response_cache import CachedListMixin, get_generations, stats as response_cache_stats
+from .conditional import ConditionalGetMixin, queryset_validators, not_modified_response, apply_validators
+from .bulk import TaskBulkWriter, SubTaskBulkWriter
+from .export import FORMATS as EXPORT_FORMATS, export_response
+from .search import FullTextSearchFilter, RankedOrderingFilter, full_text_search
+from .stats import StatsQuery, get_task_stats, get_grouped_task_stats
+from .query_budget import AUTH_QUERIES
+
+from django.db import transaction
+from django.db.models import Count
+
+
+class EagerLoadingViewMixin:
+    """Applies the eager loading declared by the serializer used for the current action."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+
+class SelectablePaginationMixin:
+    """
+    Lets clients opt into keyset pagination with ?paginate=cursor,
+    while page numbers stay the default.
+    """
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.pagination_class
+            if self.cursor_pagination_class and self.request.query_params.get('paginate') == 'cursor':
+                pagination_class = self.cursor_pagination_class
+            self._paginator = pagination_class() if pagination_class else None
+        return self._paginator
+
+
+def get_owner_id(request):
+    """Optional ?owner=<id>|me scoping shared by stats and export endpoints; other users' ids are staff only."""
+    owner = getattr(request, 'query_params', request.GET).get('owner')
+    if not owner:
+        return None
+    if owner == 'me':
+        return request.user.pk
+    if not owner.isdigit():
+        raise ValidationError({'owner': 'owner must be a user id or "me"'})
+    if int(owner) != request.user.pk and not request.user.is_staff:
+        raise PermissionDenied('Only staff can see other users\' tasks.')
+    return int(owner)
+
+
+class ExportViewMixin:
+    """Streams the filtered queryset as NDJSON or CSV (?output=), optionally gzipped (?gzip=1)."""
+    export_kind = None
+
+    def export(self, request, queryset):
+        fmt = request.query_params.get('output', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            raise ValidationError({'output': f'output must be one of: {", ".join(EXPORT_FORMATS)}'})
+        owner_id = get_owner_id(request)
+        if owner_id is not None:
+            queryset = queryset.filter(owner_id=owner_id)
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        return export_response(queryset, self.export_kind, fmt, compress)
+
+
+class TaskViewSet(CachedListMixin, ConditionalGetMixin, ExportViewMixin, EagerLoadingViewMixin, ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskModelSerializer
     permission_classes = [IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, RankedOrderingFilter]
 
     filterset_fields = ['status', 'deadline']
     search_fields = ['title', 'description']
     ordering_fields = ['created_at']
     ordering = ['-created_at']
+    export_kind = 'tasks'
+    related_last_modified = ('subtasks',)
+    etag_generations = (Category,)
+    cache_dependencies = (Task, Category)
+    replica_reads = ('list', 'stats')
+    # Per action, whatever the page or batch size; see task_manager.query_budget
+    query_budgets = {
+        'list': 3 + AUTH_QUERIES,
+        'retrieve': 3 + AUTH_QUERIES,
+        'create': 7 + AUTH_QUERIES,
+        'update': 9 + AUTH_QUERIES,
+        'partial_update': 9 + AUTH_QUERIES,
+        'destroy': 7 + AUTH_QUERIES,
+        'bulk': 10 + AUTH_QUERIES,
+        'stats': 2 + AUTH_QUERIES,
+    }
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+    def perform_update(self, serializer):
+        # Keep the task row and its outbox notification in one transaction
+        with transaction.atomic():
+            serializer.save()
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return TaskDetailSerializer
         return TaskModelSerializer
 
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        return TaskBulkWriter(request, self).dispatch()
+
+    @action(detail=False, methods=['get'], url_path='export', url_name='export')
+    def export_tasks(self, request):
+        return self.export(request, self.filter_queryset(self.get_queryset()))
+
     @action(detail=False, methods=['get'], url_path='stats', permission_classes=[IsAuthenticated])
     def stats(self, request):
-        total_tasks = Task.objects.count()
+        owner_id = get_owner_id(request)
 
-        status_counts = Task.objects.values('status').annotate(count=Count('id'))
-        overdue_tasks = Task.objects.filter(
-            Q(deadline__lt=now().date()) & ~Q(status='done')
-        ).count()
+        group_by = request.query_params.get('group_by')
+        if group_by:
+            if group_by not in StatsQuery.GROUP_BY:
+                return Response({'error': f'group_by must be one of: {", ".join(StatsQuery.GROUP_BY)}'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return Response(get_grouped_task_stats(group_by, owner_id=owner_id), status=status.HTTP_200_OK)
 
-        status_summary = {item['status']: item['count'] for item in status_counts}
+        return Response(get_task_stats(owner_id=owner_id), status=status.HTTP_200_OK)
 
-        return Response({
-            'total_tasks': total_tasks,
-            'status_counts': status_summary,
-            'overdue_tasks': overdue_tasks
-        }, status=status.HTTP_200_OK)
 
-
-class SubTaskListCreateView(ListCreateAPIView):
+class SubTaskListCreateView(CachedListMixin, ConditionalGetMixin, SelectablePaginationMixin, EagerLoadingViewMixin, ListCreateAPIView):
     queryset = SubTask.objects.all().order_by('-created_at')
     serializer_class = SubTaskCreateSerializer
     pagination_class = SubTaskPagination
+    cursor_pagination_class = SubTaskCursorPagination
     permission_classes = [IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, RankedOrderingFilter]
 
     filterset_fields = ['status', 'deadline']
     search_fields = ['title', 'description']
     ordering_fields = ['created_at']
     ordering = ['-created_at']
+    cache_dependencies = (SubTask,)
+    replica_reads = ('get', 'head')
+    query_budgets = {'get': 3 + AUTH_QUERIES, 'post': 5 + AUTH_QUERIES}
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
-class SubTaskDetailUpdateDeleteView(RetrieveUpdateDestroyAPIView):
+class SubTaskExportView(ExportViewMixin, GenericAPIView):
+    queryset = SubTask.objects.all()
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
+    filterset_fields = ['status', 'deadline', 'task']
+    search_fields = ['title', 'description']
+    export_kind = 'subtasks'
+
+    def get(self, request, *args, **kwargs):
+        return self.export(request, self.filter_queryset(self.get_queryset()))
+
+
+class SubTaskBulkView(APIView):
+    permission_classes = [IsOwnerOrReadOnly]
+    query_budgets = {'post': 6 + AUTH_QUERIES, 'patch': 6 + AUTH_QUERIES, 'delete': 6 + AUTH_QUERIES}
+
+    def post(self, request, *args, **kwargs):
+        return SubTaskBulkWriter(request, self).dispatch()
+
+    def patch(self, request, *args, **kwargs):
+        return SubTaskBulkWriter(request, self).dispatch()
+
+    def delete(self, request, *args, **kwargs):
+        return SubTaskBulkWriter(request, self).dispatch()
+
+
+class SubTaskDetailUpdateDeleteView(ConditionalGetMixin, EagerLoadingViewMixin, RetrieveUpdateDestroyAPIView):
     queryset = SubTask.objects.all()
     serializer_class = SubTaskCreateSerializer
     permission_classes = [IsOwnerOrReadOnly]
+    query_budgets = {
+        'get': 2 + AUTH_QUERIES,
+        'put': 5 + AUTH_QUERIES,
+        'patch': 5 + AUTH_QUERIES,
+        'delete': 2 + AUTH_QUERIES,
+    }
 
 
 class TaskListByDay(APIView):
     permission_classes = [IsAuthenticated]
     pagination_class = DefaultCursorPagination
+    serializer_class = TaskModelSerializer
+    replica_reads = ('get', 'head')
+    query_budgets = {'get': 3 + AUTH_QUERIES}
+    DAY_INDEX = {
+        'Monday': 2,
+        'Tuesday': 3,
+        'Wednesday': 4,
+        'Thursday': 5,
+        'Friday': 6,
+        'Saturday': 7,
+        'Sunday': 1,
+    }
 
     def get(self, request, *args, **kwargs):
         day_of_week = request.GET.get('day')
+        tasks = self.serializer_class.setup_eager_loading(Task.objects.all())
 
         if day_of_week:
-            day_index = {
-                'Monday': 2,
-                'Tuesday': 3,
-                'Wednesday': 4,
-                'Thursday': 5,
-                'Friday': 6,
-                'Saturday': 7,
-                'Sunday': 1,
-            }
-
-            weekday_num = day_index.get(day_of_week.capitalize())
+            weekday_num = self.DAY_INDEX.get(day_of_week.capitalize())
             if weekday_num is None:
                 return Response({'error': 'Invalid day name'}, status=status.HTTP_400_BAD_REQUEST)
 
-            tasks = Task.objects.annotate(weekday=ExtractWeekDay('deadline')).filter(weekday=weekday_num)
-        else:
-            tasks = Task.objects.all()
+            # Served by the (deadline_weekday, -id) index together with the cursor ordering
+            tasks = tasks.filter(deadline_weekday=weekday_num)
+
+        validators = queryset_validators(request, tasks, generations=get_generations((Category,)))
+        not_modified = not_modified_response(request, validators)
+        if not_modified:
+            return not_modified
 
-        paginator = self.pagination_class
-        page = paginator.paginate_queryset(tasks, request)
-        serializer = TaskModelSerializer(tasks, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(tasks, request, view=self)
+        serializer = self.serializer_class(page, many=True)
+        return apply_validators(paginator.get_paginated_response(serializer.data), validators)
 
-class FilteredSubTaskListView(APIView):
+
+class FilteredSubTaskListView(SelectablePaginationMixin, APIView):
     permission_classes = [IsAuthenticated]
-    pagination_class = DefaultCursorPagination
+    pagination_class = SubTaskPagination
+    cursor_pagination_class = SubTaskCursorPagination
+    replica_reads = ('get', 'head')
+    query_budgets = {'get': 3 + AUTH_QUERIES}
 
     def get(self, request, *args, **kwargs):
         task_title = request.GET.get('task_title')
         status_param = request.GET.get('status')
-        subtasks = SubTask.objects.select_related('task').order_by('-created_at')
+        subtasks = SubTaskCreateSerializer.setup_eager_loading(SubTask.objects.all()).order_by('-created_at', '-id')
 
         if task_title:
-            subtasks = subtasks.filter(task__title__icontains=task_title)
+            tasks = full_text_search(Task.objects.all(), ['title'], [task_title], rank=False)
+            subtasks = subtasks.filter(task__in=tasks.values('pk'))
         if status_param:
             subtasks = subtasks.filter(status=status_param)
 
-        paginator = SubTaskPagination()
-        page = paginator.paginate_queryset(subtasks, request)
-
-        if page is not None:
-            serializer = SubTaskCreateSerializer(page, many=True)
-            return paginator.get_paginated_response(serializer.data)
+        validators = queryset_validators(request, subtasks)
+        not_modified = not_modified_response(request, validators)
+        if not_modified:
+            return not_modified
 
-        serializer = SubTaskCreateSerializer(subtasks, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        page = self.paginator.paginate_queryset(subtasks, request, view=self)
+        serializer = SubTaskCreateSerializer(page, many=True)
+        return apply_validators(self.paginator.get_paginated_response(serializer.data), validators)
 
 
-class CategoryViewSet(ModelViewSet):
+class CategoryViewSet(CachedListMixin, ConditionalGetMixin, ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategoryCreateSerializer
     permission_classes = [IsAuthenticated]
+    cache_dependencies = (Category,)
+    replica_reads = ('list', 'count_tasks')
+    query_budgets = {
+        'list': 2 + AUTH_QUERIES,
+        'retrieve': 2 + AUTH_QUERIES,
+        'create': 4 + AUTH_QUERIES,
+        'update': 4 + AUTH_QUERIES,
+        'partial_update': 4 + AUTH_QUERIES,
+        'destroy': 2 + AUTH_QUERIES,
+        'count_tasks': 1 + AUTH_QUERIES,
+    }
 
     @action(detail=False, methods=['get'], url_path='stats', permission_classes=[IsAuthenticated])
     def count_tasks(self, request):
 
-        categories = Category.objects.annotate(task_count=Count('tasks'))
-        data = [
-            {"id": cat.id, "name": cat.name, "task_count": cat.task_count}
-            for cat in categories
-        ]
-        return Response(data)
+        data = Category.objects.values('id', 'name').annotate(task_count=Count('tasks'))
+        return Response(list(data))
+
+
+class ResponseCacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    query_budgets = {'get': AUTH_QUERIES}
+
+    def get(self, request):
+        return Response(response_cache_stats.snapshot())
 
 
 class RegisterView(CreateAPIView):
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
+    query_budgets = {'post': 5}
 
 
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
+    # The user, then the last_login update
+    query_budgets = {'post': 2}
 
     def post(self, request):
         username = request.data.get('username')
@@ -195,6 +350,7 @@ class LoginView(APIView):
 
 class LogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budgets = {'post': AUTH_QUERIES}
 
     def post(self, request):
         response = Response({"detail": "Successfully logged out."}, status=status.HTTP_200_OK)